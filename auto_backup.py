@@ -1,5 +1,7 @@
 from dotenv import load_dotenv
 import os
+import sqlite3
+import tempfile
 from discord_webhook import DiscordWebhook
 from datetime import datetime
 
@@ -18,6 +20,20 @@ DB_PATHS = [
     "db/automod.db"
 ]
 
+def snapshot_database(db_path):
+    """Return a consistent copy of the database, including pages still in the WAL file."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        copy_path = os.path.join(tmp_dir, os.path.basename(db_path))
+        source = sqlite3.connect(db_path)
+        target = sqlite3.connect(copy_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        with open(copy_path, "rb") as f:
+            return f.read()
+
 # Ensure the webhook URL is provided
 if not webhook_url:
     print("Error: WEBHOOK_URL not found in environment variables.")
@@ -33,8 +49,7 @@ try:
     # Attach each database file to the webhook
     for db_path in DB_PATHS:
         if os.path.exists(db_path):
-            with open(db_path, "rb") as f:
-                webhook.add_file(file=f.read(), filename=os.path.basename(db_path))
+            webhook.add_file(file=snapshot_database(db_path), filename=os.path.basename(db_path))
         else:
             print(f"Warning: {db_path} not found, skipping.")
 
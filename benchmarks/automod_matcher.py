@@ -0,0 +1,63 @@
+"""Compare the compiled AutoMod matcher with the old per-keyword scan.
+
+Run from the repository root:
+
+    python -m benchmarks.automod_matcher
+"""
+import random
+import string
+import time
+from utils.matcher import KeywordMatcher
+
+RULES = 10_000
+MESSAGES = 200
+MESSAGE_LENGTH = 4000  # Longest message Discord allows
+
+
+def random_word(rng, low, high):
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(low, high)))
+
+
+def naive_search(keywords, text):
+    # What AutoMod.on_message used to do for every message
+    for keyword in keywords:
+        if keyword.lower() in text.lower():
+            return keyword
+    return None
+
+
+def main():
+    rng = random.Random(42)
+    keywords = [random_word(rng, 6, 12) for _ in range(RULES)]
+    messages = []
+    for index in range(MESSAGES):
+        words = []
+        while sum(len(word) + 1 for word in words) < MESSAGE_LENGTH:
+            words.append(random_word(rng, 2, 8))
+        if index % 10 == 0:
+            # Every tenth message contains a rule near the end, the worst case for the old scan
+            words[-2] = rng.choice(keywords).upper()
+        messages.append(" ".join(words)[:MESSAGE_LENGTH])
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(keywords)
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = [matcher.search(message) for message in messages]
+    compiled_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    naive = [naive_search(keywords, message) for message in messages]
+    naive_time = time.perf_counter() - start
+
+    assert [hit is None for hit in compiled] == [hit is None for hit in naive]
+    print(f"{RULES} rules, {MESSAGES} messages of {MESSAGE_LENGTH} characters")
+    print(f"compile:         {compile_time * 1000:8.1f} ms (once per rule change)")
+    print(f"aho-corasick:    {compiled_time / MESSAGES * 1000:8.3f} ms per message")
+    print(f"per-keyword:     {naive_time / MESSAGES * 1000:8.3f} ms per message")
+    print(f"speedup:         {naive_time / compiled_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,73 @@
 import discord
 from discord.ext import commands
-import aiosqlite
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import regex
+from utils.matcher import RULE_KINDS, RuleSet, compile_rule
+
+PATTERN_BUDGET = 0.05  # Seconds of regex/glob matching allowed per message
 
 class AutoMod(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db_path = "db/automod.db"
-        self.bot.loop.create_task(self.create_tables())
-
-    async def create_tables(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS automod_rules (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    guild_id TEXT NOT NULL,
-                    keyword TEXT NOT NULL
-                )
-            """)
-            await db.commit()
-
-    async def add_rule(self, guild_id, keyword):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                "INSERT INTO automod_rules (guild_id, keyword) VALUES (?, ?)",
-                (guild_id, keyword)
-            )
-            await db.commit()
+        self.db = bot.db.automod
+        self.rulesets = {}  # guild_id -> RuleSet, compiled from that guild's rules
+        # Regex and glob rules run here so a slow pattern never blocks the event loop
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="automod")
+        self.pending_matches = set()  # Submitted pattern matches, cancelled on unload
+        bot.pipeline.register("automod", self.check_message, snapshot=self.snapshot_rules)
+
+    def cog_unload(self):
+        self.bot.pipeline.unregister("automod")
+        # shutdown(cancel_futures=True) needs Python 3.9, so matches still queued are cancelled here
+        for future in list(self.pending_matches):
+            future.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def add_rule(self, guild_id, keyword, kind="keyword"):
+        await self.db.execute(
+            "INSERT INTO automod_rules (guild_id, keyword, kind) VALUES (?, ?, ?)",
+            (guild_id, keyword, kind)
+        )
+        await self.compile_rules(guild_id)
 
     async def remove_rule(self, guild_id, keyword):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                "DELETE FROM automod_rules WHERE guild_id = ? AND keyword = ?",
-                (guild_id, keyword)
-            )
-            await db.commit()
+        await self.db.execute(
+            "DELETE FROM automod_rules WHERE guild_id = ? AND keyword = ?",
+            (guild_id, keyword)
+        )
+        await self.compile_rules(guild_id)
 
     async def list_rules(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(
-                "SELECT keyword FROM automod_rules WHERE guild_id = ?",
-                (guild_id,)
-            ) as cursor:
-                rows = await cursor.fetchall()
-                return [row[0] for row in rows]
+        rows = await self.db.fetchall(
+            "SELECT kind, keyword FROM automod_rules WHERE guild_id = ?",
+            (guild_id,)
+        )
+        return [(row[0], row[1]) for row in rows]
+
+    async def compile_rules(self, guild_id):
+        ruleset = RuleSet(await self.list_rules(guild_id))
+        self.rulesets[guild_id] = ruleset
+        return ruleset
+
+    async def get_ruleset(self, guild_id):
+        ruleset = self.rulesets.get(guild_id)
+        if ruleset is None:
+            ruleset = await self.compile_rules(guild_id)
+        return ruleset
+
+    async def find_violation(self, ruleset, content):
+        """Return the rule content breaks, or None. content must already be normalized."""
+        rule = ruleset.match_keywords(content)
+        if rule is None and ruleset.patterns:
+            try:
+                future = self.executor.submit(ruleset.match_patterns, content, PATTERN_BUDGET)
+                self.pending_matches.add(future)
+                future.add_done_callback(self.pending_matches.discard)
+                rule = await asyncio.wrap_future(future)
+            except TimeoutError:
+                print(f"AutoMod pattern rules ran out of time on a {len(content)} character message")
+        return rule
 
     @discord.slash_command(name="automod", description="Manage auto-moderation rules.")
     @commands.has_permissions(administrator=True)
@@ -50,22 +75,29 @@ class AutoMod(commands.Cog):
         self,
         ctx,
         action: discord.Option(str, "Choose an action", choices=["add", "remove", "list", "help"]),
-        keyword: discord.Option(str, "Keyword to add/remove", required=False)
+        keyword: discord.Option(str, "Keyword, regex or wildcard pattern to add/remove", required=False),
+        kind: discord.Option(str, "Type of rule to add", choices=list(RULE_KINDS), default="keyword")
     ):
         guild_id = str(ctx.guild.id)
 
         if action == "add" and keyword:
-            await self.add_rule(guild_id, keyword)
-            await ctx.respond(f"Rule added: {keyword}", ephemeral=True)
-        
+            if kind != "keyword":
+                try:
+                    compile_rule(kind, keyword)
+                except regex.error as e:
+                    await ctx.respond(f"Invalid {kind} rule: {e}", ephemeral=True)
+                    return
+            await self.add_rule(guild_id, keyword, kind)
+            await ctx.respond(f"Rule added ({kind}): {keyword}", ephemeral=True)
+
         elif action == "remove" and keyword:
             await self.remove_rule(guild_id, keyword)
             await ctx.respond(f"Rule removed: {keyword}", ephemeral=True)
-        
+
         elif action == "list":
             rules = await self.list_rules(guild_id)
             if rules:
-                response = "\n".join(rules)
+                response = "\n".join(f"`{rule_kind}` {rule}" for rule_kind, rule in rules)
                 embed = discord.Embed(
                     title="Auto-Moderation Rules",
                     description=response,
@@ -74,16 +106,16 @@ class AutoMod(commands.Cog):
                 await ctx.respond(embed=embed, ephemeral=True)
             else:
                 await ctx.respond("No rules found.", ephemeral=True)
-        
+
         elif action == "help":
             embed = discord.Embed(
                 title="AutoMod Help",
                 description="List of AutoMod commands:",
                 color=discord.Color.green()
             )
-            embed.add_field(name="/automod add <keyword>", value="Add a keyword to the auto-moderation list.", inline=False)
-            embed.add_field(name="/automod remove <keyword>", value="Remove a keyword from the auto-moderation list.", inline=False)
-            embed.add_field(name="/automod list", value="List all auto-moderation keywords.", inline=False)
+            embed.add_field(name="/automod add <keyword> [kind]", value="Add a rule. Kind is `keyword` (default), `regex`, or `glob` (`*` and `?` wildcards).", inline=False)
+            embed.add_field(name="/automod remove <keyword>", value="Remove a rule from the auto-moderation list.", inline=False)
+            embed.add_field(name="/automod list", value="List all auto-moderation rules.", inline=False)
             embed.add_field(name="/automod help", value="Display this help message.", inline=False)
 
             await ctx.respond(embed=embed, ephemeral=True)
@@ -91,18 +123,18 @@ class AutoMod(commands.Cog):
         else:
             await ctx.respond("Invalid action. Use /automod help for more information.", ephemeral=True)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return
+    async def snapshot_rules(self, context):
+        return await self.get_ruleset(str(context.guild.id))
 
-        guild_id = str(message.guild.id)
-        rules = await self.list_rules(guild_id)
-        for keyword in rules:
-            if keyword.lower() in message.content.lower():
-                await message.delete()
-                await message.channel.send(f"Message from {message.author.mention} was removed due to prohibited content.")
-                break
+    async def check_message(self, context):
+        ruleset = context.config["automod"]
+        if not ruleset:
+            return
+        if await self.find_violation(ruleset, context.normalized) is not None:
+            # A removed message should not earn XP or trigger pings
+            context.stop()
+            await context.message.delete()
+            await context.channel.send(f"Message from {context.author.mention} was removed due to prohibited content.")
 
 def setup(bot):
     bot.add_cog(AutoMod(bot))
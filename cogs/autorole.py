@@ -1,101 +1,255 @@
 import discord
 from discord.ext import commands
-import aiosqlite
+import asyncio
+import time
+from utils.scheduler import DeadlineScheduler
+from utils.cache import LazyCache, by_guild
+from utils.progress import InteractionProgress
+
+SYNC_CHUNK = 500  # Members given roles per step of /autorole sync; progress is saved after each step
 
 class AutoRole(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.autoroles = LazyCache(self.load_autoroles)  # guild_id -> {role_id: delay in seconds}; mirrors the autoroles table
+        # Delayed autoroles, keyed by (guild_id, member_id, delay)
+        self.scheduler = DeadlineScheduler(self.assign_delayed)
+        self.sync_tasks = {}  # guild_id -> running /autorole sync
+        bot.joins.register("autorole", self.assign_autorole)
+        bot.loop.create_task(self.resume_syncs())
+
+    def cog_unload(self):
+        self.bot.joins.unregister("autorole")
+        self.scheduler.stop()
+        for task in self.sync_tasks.values():
+            task.cancel()
+
+    async def load_autoroles(self):
+        return by_guild(await self.bot.db.configs.fetchall("SELECT guild_id, role_id, delay FROM autoroles"))
+
+    async def get_autoroles(self, guild_id):
+        """Return the guild's autoroles as {role_id: delay}."""
+        return (await self.autoroles.get()).setdefault(guild_id, {})
+
+    async def add_autorole(self, guild_id, role_id, delay=0):
+        """Add an auto role for a guild, or change its delay."""
+        await self.bot.db.configs.execute("""
+            INSERT INTO autoroles (guild_id, role_id, delay) VALUES (?, ?, ?)
+            ON CONFLICT (guild_id, role_id) DO UPDATE SET delay = excluded.delay
+        """, (guild_id, role_id, delay))
+        (await self.get_autoroles(guild_id))[role_id] = delay
 
-    async def create_table(self):
-        """Create the main table if it doesn't exist."""
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS autorole_config (
-                    guild_id INTEGER PRIMARY KEY,
-                    role_id INTEGER
-                )
-            """)
-            await db.commit()
-
-    async def set_autorole(self, guild_id, role_id):
-        """Set the auto role for a guild."""
-        await self.create_table()
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute("""
-                INSERT OR REPLACE INTO autorole_config (guild_id, role_id)
-                VALUES (?, ?)
-            """, (guild_id, role_id))
-            await db.commit()
-
-    async def get_autorole(self, guild_id):
-        """Retrieve the auto role for a guild."""
-        await self.create_table()
-        async with aiosqlite.connect("./db/configs.db") as db:
-            async with db.execute("""
-                SELECT role_id FROM autorole_config WHERE guild_id = ?
-            """, (guild_id,)) as cursor:
-                row = await cursor.fetchone()
-                return row[0] if row else None
-
-    async def delete_autorole(self, guild_id):
-        """Delete the auto role configuration for a guild."""
-        await self.create_table()
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute("""
-                DELETE FROM autorole_config WHERE guild_id = ?
-            """, (guild_id,))
-            await db.commit()
+    async def remove_autorole(self, guild_id, role_id):
+        """Remove one auto role from a guild."""
+        await self.bot.db.configs.execute("""
+            DELETE FROM autoroles WHERE guild_id = ? AND role_id = ?
+        """, (guild_id, role_id))
+        return (await self.get_autoroles(guild_id)).pop(role_id, None)
+
+    async def delete_autoroles(self, guild_id):
+        """Delete every auto role of a guild."""
+        await self.bot.db.configs.execute("""
+            DELETE FROM autoroles WHERE guild_id = ?
+        """, (guild_id,))
+        (await self.get_autoroles(guild_id)).clear()
+
+    async def check_bot_permissions(self, ctx):
+        if ctx.guild.me.guild_permissions.manage_roles:
+            return True
+        embed = discord.Embed(
+            title="Permission Error",
+            description="I do not have the required permissions to manage roles.",
+            color=discord.Color.red()
+        )
+        await ctx.respond(embed=embed)
+        return False
 
     autorole = discord.SlashCommandGroup(name="autorole", description="Auto role commands")
 
-    @autorole.command(name="set", description="Set the auto role for the server")
+    @autorole.command(name="add", description="Add a role given to new members")
     @commands.has_permissions(manage_roles=True)
-    async def autorole_set(self, ctx, role: discord.Role):
-        if ctx.guild.me.guild_permissions.manage_roles:
-            await self.set_autorole(ctx.guild.id, role.id)
+    async def autorole_add(
+        self,
+        ctx,
+        role: discord.Role,
+        delay: discord.Option(int, "Seconds to wait after a member joins", min_value=0, default=0)
+    ):
+        if await self.check_bot_permissions(ctx):
+            await self.add_autorole(ctx.guild.id, role.id, delay)
             embed = discord.Embed(
-                title="Auto Role Set",
-                description=f"Auto role has been set to {role.mention}.",
+                title="Auto Role Added",
+                description=f"{role.mention} will be given to new members" + (f" {delay} seconds after they join." if delay else "."),
                 color=discord.Color.blue()
             )
             await ctx.respond(embed=embed)
-        else:
+
+    @autorole.command(name="remove", description="Stop giving a role to new members")
+    @commands.has_permissions(manage_roles=True)
+    async def autorole_remove(self, ctx, role: discord.Role):
+        if await self.check_bot_permissions(ctx):
+            if await self.remove_autorole(ctx.guild.id, role.id) is None:
+                return await ctx.respond(f"{role.mention} is not an auto role.", ephemeral=True)
             embed = discord.Embed(
-                title="Permission Error",
-                description="I do not have the required permissions to manage roles.",
-                color=discord.Color.red()
+                title="Auto Role Removed",
+                description=f"{role.mention} will no longer be given to new members.",
+                color=discord.Color.blue()
             )
             await ctx.respond(embed=embed)
 
-    @autorole.command(name="disable", description="Disable the auto role")
+    @autorole.command(name="list", description="List the auto roles of the server")
+    async def autorole_list(self, ctx):
+        autoroles = await self.get_autoroles(ctx.guild.id)
+        embed = discord.Embed(title="Auto Roles", color=discord.Color.blue())
+        if autoroles:
+            embed.description = "\n".join(
+                f"<@&{role_id}>" + (f" after {delay} seconds" if delay else "") for role_id, delay in autoroles.items()
+            )
+        else:
+            embed.description = "No auto roles are set."
+        await ctx.respond(embed=embed)
+
+    @autorole.command(name="disable", description="Disable every auto role")
     @commands.has_permissions(manage_roles=True)
     async def autorole_disable(self, ctx):
-        if ctx.guild.me.guild_permissions.manage_roles:
-            await self.delete_autorole(ctx.guild.id)
+        if await self.check_bot_permissions(ctx):
+            await self.delete_autoroles(ctx.guild.id)
             embed = discord.Embed(
                 title="Auto Role Disabled",
-                description="Auto role has been disabled.",
+                description="Auto roles have been disabled.",
                 color=discord.Color.blue()
             )
             await ctx.respond(embed=embed)
-        else:
-            embed = discord.Embed(
-                title="Permission Error",
-                description="I do not have the required permissions to manage roles.",
-                color=discord.Color.red()
+
+    @autorole.command(name="sync", description="Give the auto roles to existing members who are missing them")
+    @commands.has_permissions(manage_roles=True)
+    async def autorole_sync(self, ctx):
+        if not await self.check_bot_permissions(ctx):
+            return
+        if ctx.guild.id in self.sync_tasks:
+            return await ctx.respond("An auto role sync is already running for this server.", ephemeral=True)
+        await ctx.defer()
+        report = InteractionProgress(ctx)
+
+        async def report_progress(updated, remaining):
+            await report.update(f"Updated {updated} members, {remaining} left...")
+
+        updated = await self.start_sync(ctx.guild, progress=report_progress)
+        embed = discord.Embed(
+            title="Auto Roles Synced",
+            description=f"Gave missing auto roles to {updated} members.",
+            color=discord.Color.green()
+        )
+        await report.finish(embed)
+
+    def start_sync(self, guild, progress=None):
+        task = self.sync_tasks.get(guild.id)
+        if task is None:
+            task = self.sync_tasks[guild.id] = asyncio.ensure_future(self.sync_autoroles(guild, progress))
+            task.add_done_callback(lambda _: self.sync_tasks.pop(guild.id, None))
+        return task
+
+    async def sync_autoroles(self, guild, progress=None):
+        """Give cached members the autoroles they lack, returning how many were updated.
+
+        One pass over the member cache works out what each member is missing;
+        members are then handled in ID order, SYNC_CHUNK at a time, through
+        bot.roles. The last finished member ID is saved after every chunk, so
+        a sync cut short by a restart picks up where it stopped.
+        """
+        db = self.bot.db.configs
+        row = await db.fetchone("SELECT last_member_id, updated FROM autorole_sync WHERE guild_id = ?", (guild.id,))
+        if row is None:
+            await db.execute("INSERT INTO autorole_sync (guild_id) VALUES (?)", (guild.id,))
+            row = (0, 0)
+        last_member_id, updated = row
+
+        autoroles = []  # (role, delay)
+        for role_id, delay in (await self.get_autoroles(guild.id)).items():
+            role = guild.get_role(role_id)
+            if role is not None:
+                autoroles.append((role, delay))
+        # Members still inside a role's delay get it from the scheduler instead
+        await self.schedule_delayed(guild)
+        now = time.time()
+        missing = []  # (member, roles to add), in member ID order
+        for member in sorted(guild.members, key=lambda member: member.id):
+            if member.id <= last_member_id:
+                continue
+            held = {role.id for role in member.roles}
+            joined_at = member.joined_at.timestamp() if member.joined_at else 0
+            roles = [role for role, delay in autoroles if role.id not in held and joined_at + delay <= now]
+            if roles:
+                missing.append((member, roles))
+
+        for start in range(0, len(missing), SYNC_CHUNK):
+            chunk = missing[start:start + SYNC_CHUNK]
+            edits = [self.bot.roles.add(member, *roles, reason="Auto role sync") for member, roles in chunk]
+            updated += sum(await asyncio.gather(*edits))
+            await db.execute(
+                "UPDATE autorole_sync SET last_member_id = ?, updated = ? WHERE guild_id = ?",
+                (chunk[-1][0].id, updated, guild.id)
             )
-            await ctx.respond(embed=embed)
+            if progress:
+                await progress(updated, len(missing) - start - len(chunk))
+
+        await db.execute("DELETE FROM autorole_sync WHERE guild_id = ?", (guild.id,))
+        return updated
+
+    async def schedule_delayed(self, guild):
+        """Schedule the delayed autoroles of cached members who joined less than that delay ago.
+
+        Pending grants only live in the scheduler, so this recovers them after
+        a restart. Grants already queued are left as they are.
+        """
+        delays = {delay for delay in (await self.get_autoroles(guild.id)).values() if delay}
+        if not delays:
+            return
+        now = time.time()
+        for member in guild.members:
+            if member.joined_at is None:
+                continue
+            joined_at = member.joined_at.timestamp()
+            for delay in delays:
+                key = (guild.id, member.id, delay)
+                if joined_at + delay > now and key not in self.scheduler.deadlines:
+                    self.scheduler.schedule(key, joined_at + delay)
+
+    async def resume_syncs(self):
+        await self.bot.wait_until_ready()
+        for guild in self.bot.guilds:
+            await self.schedule_delayed(guild)
+        self.scheduler.start()
+        for (guild_id,) in await self.bot.db.configs.fetchall("SELECT guild_id FROM autorole_sync"):
+            guild = self.bot.get_guild(guild_id)
+            if guild:
+                print(f"Resuming auto role sync for guild {guild_id}")
+                self.start_sync(guild)
+
+    async def assign_autorole(self, batch):
+        autoroles = await self.get_autoroles(batch.guild.id)
+        if autoroles:
+            immediate = [batch.guild.get_role(role_id) for role_id, delay in autoroles.items() if not delay]
+            immediate = [role for role in immediate if role is not None]
+            delays = {delay for delay in autoroles.values() if delay}
+            for member in batch.members:
+                # Paced and merged with any other role changes by the shared queue
+                if immediate:
+                    self.bot.roles.add(member, *immediate, reason="Auto role")
+                for delay in delays:
+                    self.scheduler.schedule((batch.guild.id, member.id, delay), time.time() + delay)
 
-    @commands.Cog.listener()
-    async def on_member_join(self, member):
-        role_id = await self.get_autorole(member.guild.id)
-        if role_id:
-            role = member.guild.get_role(role_id)
-            if role:
-                try:
-                    await member.add_roles(role)
-                except discord.Forbidden:
-                    pass
+    async def assign_delayed(self, key):
+        guild_id, member_id, delay = key
+        guild = self.bot.get_guild(guild_id)
+        member = guild.get_member(member_id) if guild else None
+        if member is None:
+            return
+        roles = [
+            guild.get_role(role_id) for role_id, role_delay in (await self.get_autoroles(guild_id)).items() if role_delay == delay
+        ]
+        roles = [role for role in roles if role is not None]
+        if roles:
+            self.bot.roles.add(member, *roles, reason="Auto role")
 
 def setup(bot):
     bot.add_cog(AutoRole(bot))
@@ -1,45 +1,28 @@
 import discord
 from discord.ext import commands
-import aiosqlite
 
 class Bank(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db_path = "./db/economy.db"
-        bot.loop.create_task(self.initialize_db())
-
-    async def initialize_db(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY,
-                    coins INTEGER NOT NULL,
-                    weekly_timestamp INTEGER NOT NULL,
-                    daily_timestamp INTEGER NOT NULL,
-                    bank INTEGER NOT NULL
-                )
-            """)
-            await db.commit()
+        self.db = bot.db.economy
 
     async def get_user(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("SELECT coins, weekly_timestamp, daily_timestamp, bank FROM users WHERE id = ?", (user_id,)) as cursor:
-                user = await cursor.fetchone()
-                if user is None:
-                    # Initialize user data if not found
-                    await db.execute(
-                        "INSERT INTO users (id, coins, weekly_timestamp, daily_timestamp, bank) VALUES (?, 0, 0, 0, 0)",
-                        (user_id,)
-                    )
-                    await db.commit()
-                    return {"coins": 0, "weekly_timestamp": 0, "daily_timestamp": 0, "bank": 0}
-                else:
-                    return {
-                        "coins": user[0],
-                        "weekly_timestamp": user[1],
-                        "daily_timestamp": user[2],
-                        "bank": user[3],
-                    }
+        user = await self.db.fetchone("SELECT coins, weekly_timestamp, daily_timestamp, bank FROM users WHERE id = ?", (user_id,))
+        if user is None:
+            # Initialize user data if not found
+            await self.db.execute(
+                "INSERT INTO users (id, coins, weekly_timestamp, daily_timestamp, bank) VALUES (?, 0, 0, 0, 0)",
+                (user_id,)
+            )
+            await self.bot.leaderboards.sync_coins(user_id)
+            return {"coins": 0, "weekly_timestamp": 0, "daily_timestamp": 0, "bank": 0}
+        else:
+            return {
+                "coins": user[0],
+                "weekly_timestamp": user[1],
+                "daily_timestamp": user[2],
+                "bank": user[3],
+            }
 
     @discord.slash_command(name="bank", description="Bank-related commands.")
     async def bank(self, ctx: discord.ApplicationContext, action: discord.Option(str, "Choose an action", choices=["deposit", "balance", "withdraw", "help"]), amount: discord.Option(int, "Amount to deposit/withdraw", required=False)):
@@ -54,9 +37,8 @@ class Bank(commands.Cog):
                 await ctx.respond("Insufficient coins in your wallet to deposit.", ephemeral=True)
                 return
 
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute("UPDATE users SET coins = coins - ?, bank = bank + ? WHERE id = ?", (amount, amount, ctx.author.id))
-                await db.commit()
+            await self.db.execute("UPDATE users SET coins = coins - ?, bank = bank + ? WHERE id = ?", (amount, amount, ctx.author.id))
+            await self.bot.leaderboards.sync_coins(ctx.author.id)
 
             embed = discord.Embed(
                 title="Deposit Successful",
@@ -76,9 +58,8 @@ class Bank(commands.Cog):
                 await ctx.respond("Insufficient coins in your bank to withdraw.", ephemeral=True)
                 return
 
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute("UPDATE users SET bank = bank - ?, coins = coins + ? WHERE id = ?", (amount, amount, ctx.author.id))
-                await db.commit()
+            await self.db.execute("UPDATE users SET bank = bank - ?, coins = coins + ? WHERE id = ?", (amount, amount, ctx.author.id))
+            await self.bot.leaderboards.sync_coins(ctx.author.id)
 
             embed = discord.Embed(
                 title="Withdrawal Successful",
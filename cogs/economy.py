@@ -1,11 +1,9 @@
 import discord
 from discord.ext import commands
-import aiosqlite
 import datetime
-import aiohttp
-import json
 import os
 from dotenv import load_dotenv
+from utils.leaderboard import LeaderboardView
 
 # Load environment variables
 load_dotenv()
@@ -13,80 +11,54 @@ load_dotenv()
 class Economy(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        bot.loop.create_task(self.initialize_db())
-        self.username_cache_file = "./temp/username_cache.json"
-        self.username_cache = self.load_username_cache()
         self.guild_id = int(os.getenv("GUILD_ID", "0000000000000000000"))
         self.channel_id = int(os.getenv("CHANNEL_ID", "000000000000000000"))
 
-    def load_username_cache(self):
-        if os.path.exists(self.username_cache_file):
-            with open(self.username_cache_file, 'r') as f:
-                return json.load(f)
-        return {}
-
-    def save_username_cache(self):
-        with open(self.username_cache_file, 'w') as f:
-            json.dump(self.username_cache, f, indent=4)
-
-    async def fetch_username(self, user_id):
-        if user_id in self.username_cache:
-            return self.username_cache[user_id]
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"https://discordlookup.mesalytic.moe/v1/user/{user_id}") as resp:
-                if resp.status == 200:
-                    user_data = await resp.json()
-                    username = user_data.get("username", f"User: {user_id}")
-                else:
-                    username = f"User: {user_id}"
-
-        self.username_cache[user_id] = username
-        self.save_username_cache()
-        return username
-
-    async def initialize_db(self):
-        async with aiosqlite.connect("./db/economy.db") as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY,
-                    coins INTEGER NOT NULL,
-                    weekly_timestamp INTEGER NOT NULL,
-                    daily_timestamp INTEGER NOT NULL,
-                    bank INTEGER NOT NULL
-                )
-            """)
-            await db.commit()
-
     async def get_user(self, user_id):
-        async with aiosqlite.connect("./db/economy.db") as db:
-            async with db.execute("SELECT * FROM users WHERE id = ?", (user_id,)) as cursor:
-                user = await cursor.fetchone()
-                if user is None:
-                    await db.execute(
-                        "INSERT INTO users (id, coins, weekly_timestamp, daily_timestamp, bank) VALUES (?, ?, ?, ?, ?)",
-                        (user_id, 0, 0, 0, 0),
-                    )
-                    await db.commit()
-                    return {
-                        "coins": 0,
-                        "weekly_timestamp": 0,
-                        "daily_timestamp": 0,
-                        "bank": 0
-                    }
-                else:
-                    return {
-                        "coins": user[1],
-                        "weekly_timestamp": user[2],
-                        "daily_timestamp": user[3],
-                        "bank": user[4],
-                    }
+        db = self.bot.db.economy
+        user = await db.fetchone("SELECT * FROM users WHERE id = ?", (user_id,))
+        if user is None:
+            await db.execute(
+                "INSERT INTO users (id, coins, weekly_timestamp, daily_timestamp, bank) VALUES (?, ?, ?, ?, ?)",
+                (user_id, 0, 0, 0, 0),
+            )
+            await self.bot.leaderboards.sync_coins(user_id)
+            return {
+                "coins": 0,
+                "weekly_timestamp": 0,
+                "daily_timestamp": 0,
+                "bank": 0
+            }
+        else:
+            return {
+                "coins": user[1],
+                "weekly_timestamp": user[2],
+                "daily_timestamp": user[3],
+                "bank": user[4],
+            }
+
+    async def render_leaderboard_page(self, entries, first_rank):
+        embed = discord.Embed(
+            title="Economy Leaderboard",
+            description="",
+            color=discord.Color.blue()
+        )
+        if not entries:
+            embed.description = "No leaderboard data available."
+        usernames = await self.bot.usernames.resolve_many(user_id for user_id, _ in entries)
+        for rank, (user_id, coins) in enumerate(entries, start=first_rank):
+            embed.add_field(
+                name=f"#{rank}: {usernames[user_id]}",
+                value=f"**{coins}** Coins",
+                inline=False
+            )
+        return embed
 
     @discord.slash_command(name="economy", description="Economy commands.")
     async def economy(
         self,
         ctx: discord.ApplicationContext,
-        action: discord.Option(str, "Choose an action", choices=["daily", "weekly", "balance", "leaderboard", "transfer", "help"]),
+        action: discord.Option(str, "Choose an action", choices=["daily", "weekly", "balance", "leaderboard", "rank", "transfer", "help"]),
         recipient: discord.Option(discord.Member, "Recipient for transfer", required=False),
         amount: discord.Option(int, "Amount of coins", required=False),
         code: discord.Option(str, "Coupon code", required=False),
@@ -98,12 +70,11 @@ class Economy(commands.Cog):
                 now = round(datetime.datetime.now().timestamp())
 
                 if user["daily_timestamp"] == 0 or user["daily_timestamp"] + 86400 <= now:
-                    async with aiosqlite.connect("./db/economy.db") as db:
-                        await db.execute(
-                            "UPDATE users SET coins = coins + 50, daily_timestamp = ? WHERE id = ?",
-                            (now, ctx.author.id),
-                        )
-                        await db.commit()
+                    await self.bot.db.economy.execute(
+                        "UPDATE users SET coins = coins + 50, daily_timestamp = ? WHERE id = ?",
+                        (now, ctx.author.id),
+                    )
+                    await self.bot.leaderboards.sync_coins(ctx.author.id)
                     embed = discord.Embed(
                         title="Daily Reward Claimed",
                         description="You have successfully claimed your daily reward of 50 coins!",
@@ -124,12 +95,11 @@ class Economy(commands.Cog):
                 now = round(datetime.datetime.now().timestamp())
 
                 if user["weekly_timestamp"] == 0 or user["weekly_timestamp"] + 604800 <= now:
-                    async with aiosqlite.connect("./db/economy.db") as db:
-                        await db.execute(
-                            "UPDATE users SET coins = coins + 300, weekly_timestamp = ? WHERE id = ?",
-                            (now, ctx.author.id),
-                        )
-                        await db.commit()
+                    await self.bot.db.economy.execute(
+                        "UPDATE users SET coins = coins + 300, weekly_timestamp = ? WHERE id = ?",
+                        (now, ctx.author.id),
+                    )
+                    await self.bot.leaderboards.sync_coins(ctx.author.id)
                     embed = discord.Embed(
                         title="Weekly Reward Claimed",
                         description="You have successfully claimed your weekly reward of 300 coins!",
@@ -158,31 +128,26 @@ class Economy(commands.Cog):
                 await ctx.respond(embed=embed)
 
             elif action == "leaderboard":
-                async with aiosqlite.connect("./db/economy.db") as db:
-                    async with db.execute("SELECT * FROM users ORDER BY coins DESC LIMIT 10") as cursor:
-                        users = await cursor.fetchall()
-                        embed = discord.Embed(
-                            title="Economy Leaderboard",
-                            description="",
-                            color=discord.Color.blue()
-                        )
-
-                        if not users:
-                            embed.description = "No leaderboard data available."
-                        else:
-                            async with aiohttp.ClientSession() as session:
-                                for idx, user in enumerate(users, start=1):
-                                    user_id = user[0]
-                                    username = await self.fetch_username(user_id)
-                                    
-                                    embed.add_field(
-                                        name=f"#{idx}: {username}",
-                                        value=f"**{user[1]}** Coins",
-                                        inline=False
-                                    )
-
-                        embed.set_footer(text=f"Requested by {ctx.author.display_name}", icon_url=ctx.author.avatar.url)
-                        await ctx.respond(embed=embed)
+                board = await self.bot.leaderboards.get_coins()
+                view = LeaderboardView(ctx.author, board, self.bot.leaderboards.fetch_coins_page, self.render_leaderboard_page)
+                embed = await view.load(0)
+                await ctx.respond(embed=embed, view=view)
+
+            elif action == "rank":
+                target_user = recipient or ctx.author
+                board = await self.bot.leaderboards.get_coins()
+                rank = board.rank(target_user.id)
+                if rank is None:
+                    description = f"{target_user.display_name} does not have an account yet."
+                else:
+                    description = f"{target_user.display_name} is ranked **#{rank}** of {len(board)} with **{board.score(target_user.id)}** coins."
+                embed = discord.Embed(
+                    title="Economy Rank",
+                    description=description,
+                    color=discord.Color.blue()
+                )
+                embed.set_footer(text=f"Requested by {ctx.author.display_name}", icon_url=ctx.author.avatar.url)
+                await ctx.respond(embed=embed)
 
             elif action == "transfer":
                 if recipient is None or amount is None or amount <= 0:
@@ -200,10 +165,10 @@ class Economy(commands.Cog):
                     await ctx.respond("You do not have enough coins to complete this transfer.", ephemeral=True)
                     return
 
-                async with aiosqlite.connect("./db/economy.db") as db:
+                async with self.bot.db.economy.transaction() as db:
                     await db.execute("UPDATE users SET coins = coins - ? WHERE id = ?", (amount, ctx.author.id))
                     await db.execute("UPDATE users SET coins = coins + ? WHERE id = ?", (amount, recipient.id))
-                    await db.commit()
+                await self.bot.leaderboards.sync_coins(ctx.author.id, recipient.id)
 
                 embed = discord.Embed(
                     title="Transfer Successful",
@@ -242,6 +207,7 @@ class Economy(commands.Cog):
                         "**/economy weekly** - Claim your weekly reward\n"
                         "**/economy balance** - Check your balance\n"
                         "**/economy leaderboard** - View the top users\n"
+                        "**/economy rank** - See where you stand on the leaderboard\n"
                         "**/economy transfer** - Transfer coins to another user"
                     ),
                     color=discord.Color.blue(),
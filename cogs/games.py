@@ -1,41 +1,38 @@
 import discord
 from discord.ext import commands
-import aiosqlite
 import random
 import asyncio
 
 class Economy:
-    @staticmethod
-    async def add_coins(user_id: int, coins: int):
-        async with aiosqlite.connect("./db/economy.db") as db:
-            await db.execute(
-                "UPDATE users SET coins = coins + ? WHERE id = ?",
-                (coins, user_id)
-            )
-            await db.commit()
-
-    @staticmethod
-    async def remove_coins(user_id: int, coins: int):
-        async with aiosqlite.connect("./db/economy.db") as db:
-            await db.execute(
-                "UPDATE users SET coins = coins - ? WHERE id = ?",
-                (coins, user_id)
-            )
-            await db.commit()
-
-    @staticmethod
-    async def get_coins(user_id: int):
-        async with aiosqlite.connect("./db/economy.db") as db:
-            async with db.execute(
-                "SELECT coins FROM users WHERE id = ?",
-                (user_id,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                return row[0] if row else 0
+    def __init__(self, db, leaderboards):
+        self.db = db
+        self.leaderboards = leaderboards
+
+    async def add_coins(self, user_id: int, coins: int):
+        await self.db.execute(
+            "UPDATE users SET coins = coins + ? WHERE id = ?",
+            (coins, user_id)
+        )
+        await self.leaderboards.sync_coins(user_id)
+
+    async def remove_coins(self, user_id: int, coins: int):
+        await self.db.execute(
+            "UPDATE users SET coins = coins - ? WHERE id = ?",
+            (coins, user_id)
+        )
+        await self.leaderboards.sync_coins(user_id)
+
+    async def get_coins(self, user_id: int):
+        row = await self.db.fetchone(
+            "SELECT coins FROM users WHERE id = ?",
+            (user_id,)
+        )
+        return row[0] if row else 0
 
 class Games(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.economy = Economy(bot.db.economy, bot.leaderboards)
 
     games = discord.SlashCommandGroup(name="games", description="Various gambling games")
 
@@ -44,7 +41,7 @@ class Games(commands.Cog):
         if coins <= 0:
             await ctx.respond("You can't gamble 0 coins or negative coins.", ephemeral=True)
             return
-        user_coins = await Economy.get_coins(ctx.author.id)
+        user_coins = await self.economy.get_coins(ctx.author.id)
         if user_coins < coins:
             await ctx.respond("You don't have enough coins to gamble.", ephemeral=True)
             return
@@ -54,10 +51,10 @@ class Games(commands.Cog):
 
         embed = discord.Embed(color=discord.Color.blurple())
         if result == result_2:
-            await Economy.add_coins(ctx.author.id, coins)
+            await self.economy.add_coins(ctx.author.id, coins)
             embed.add_field(name="🎉 You won!", value=f"You won {coins} coins", inline=False)
         else:
-            await Economy.remove_coins(ctx.author.id, coins)
+            await self.economy.remove_coins(ctx.author.id, coins)
             embed.add_field(name="💔 You lost!", value=f"You lost {coins} coins", inline=False)
         embed.set_footer(text=f"Result: {result} and {result_2}")
 
@@ -68,7 +65,7 @@ class Games(commands.Cog):
         if coins <= 0:
             await ctx.respond("You can't gamble 0 coins or negative coins.", ephemeral=True)
             return
-        user_coins = await Economy.get_coins(ctx.author.id)
+        user_coins = await self.economy.get_coins(ctx.author.id)
         if user_coins < coins:
             await ctx.respond("You don't have enough coins to gamble.", ephemeral=True)
             return
@@ -88,11 +85,11 @@ class Games(commands.Cog):
         await asyncio.sleep(1)
         embed = discord.Embed(color=discord.Color.blurple())
         if slot1 == slot2 == slot3:
-            await Economy.add_coins(ctx.author.id, coins * 10)
-            embed.add_field(name="🎉 You won!", value=f"You won {coins * 10} coins! Your balance is: **{await Economy.get_coins(ctx.author.id)}**", inline=False)
+            await self.economy.add_coins(ctx.author.id, coins * 10)
+            embed.add_field(name="🎉 You won!", value=f"You won {coins * 10} coins! Your balance is: **{await self.economy.get_coins(ctx.author.id)}**", inline=False)
         else:
-            embed.add_field(name="💔 You lost!", value=f"You lost {coins} coins! Your balance is: **{await Economy.get_coins(ctx.author.id)}**", inline=False)
-            await Economy.remove_coins(ctx.author.id, coins)
+            embed.add_field(name="💔 You lost!", value=f"You lost {coins} coins! Your balance is: **{await self.economy.get_coins(ctx.author.id)}**", inline=False)
+            await self.economy.remove_coins(ctx.author.id, coins)
         embed.set_footer(text=f"Result: {slot1} {slot2} {slot3}")
 
         await ctx.respond(embed=embed)
@@ -105,7 +102,7 @@ class Games(commands.Cog):
         if choice.lower() not in ["heads", "tails"]:
             await ctx.respond("Invalid choice. Choose heads or tails.", ephemeral=True)
             return
-        user_coins = await Economy.get_coins(ctx.author.id)
+        user_coins = await self.economy.get_coins(ctx.author.id)
         if user_coins < coins:
             await ctx.respond("You don't have enough coins to gamble.", ephemeral=True)
             return
@@ -120,12 +117,12 @@ class Games(commands.Cog):
         await asyncio.sleep(2)
         embed = discord.Embed(color=discord.Color.blurple())
         if choice.lower() == result:
-            await Economy.add_coins(ctx.author.id, coinsa)
-            balance = await Economy.get_coins(ctx.author.id)
+            await self.economy.add_coins(ctx.author.id, coinsa)
+            balance = await self.economy.get_coins(ctx.author.id)
             embed.add_field(name="🎉 You won!", value=f"You won {coinsa} coins! Your balance is: **{balance}**", inline=False)
         else:
-            await Economy.remove_coins(ctx.author.id, coins)
-            balance = await Economy.get_coins(ctx.author.id)
+            await self.economy.remove_coins(ctx.author.id, coins)
+            balance = await self.economy.get_coins(ctx.author.id)
             embed.add_field(name="💔 You lost!", value=f"You lost {coins} coins! Your balance is: **{balance}**", inline=False)
         embed.set_footer(text=f"Result: {result}")
 
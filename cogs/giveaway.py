@@ -1,22 +1,144 @@
 import discord
 from discord.ext import commands, tasks
-import aiosqlite
+import asyncio
 import datetime
 import random
+import re
+import time
+from utils.levels import LEVEL_CURVE
+from utils.scheduler import DeadlineScheduler
+from utils.buffer import WriteBehindBuffer
+
+GIVEAWAY_MODES = ("entries", "harvest")
+MAX_VERIFY_BATCH = 100  # Most member lookups in flight at once while verifying winners
+ENTRY_RETENTION = 7 * 24 * 3600  # Seconds an ended giveaway's entries are kept for rerolls
+
+class EntryRequirements:
+    """What an entrant needs to be drawn as a winner.
+
+    Nothing is checked when people react; level and balance are filtered in
+    bulk with one joined query at draw time, and roles are checked on the
+    member objects of the drawn candidates.
+    """
+
+    def __init__(self, min_level=0, min_coins=0, required_roles=(), blocked_roles=()):
+        self.min_level = min_level
+        self.min_coins = min_coins
+        self.required_roles = frozenset(required_roles)
+        self.blocked_roles = frozenset(blocked_roles)
+
+    @classmethod
+    def parse(cls, thresholds, roles):
+        """Read the modal fields, e.g. "level 5, coins 100" and "+123 -456". Raises ValueError."""
+        values = {key.lower(): int(value) for key, value in re.findall(r"(level|coins)\s*[:=]?\s*(\d+)", thresholds or "", re.IGNORECASE)}
+        required, blocked = set(), set()
+        for sign, role_id in re.findall(r"([+-])\s*(?:<@&)?(\d+)>?", roles or ""):
+            (required if sign == "+" else blocked).add(int(role_id))
+        if (thresholds or "").strip() and not values:
+            raise ValueError("Unrecognised level/coin requirement")
+        return cls(values.get("level", 0), values.get("coins", 0), required, blocked)
+
+    @classmethod
+    def from_row(cls, min_level, min_coins, required_roles, blocked_roles):
+        def ids(text):
+            return [int(role_id) for role_id in text.split(",") if role_id]
+        return cls(min_level, min_coins, ids(required_roles), ids(blocked_roles))
+
+    def to_row(self):
+        return (
+            self.min_level,
+            self.min_coins,
+            ",".join(map(str, sorted(self.required_roles))),
+            ",".join(map(str, sorted(self.blocked_roles))),
+        )
+
+    @property
+    def checks_stats(self):
+        return self.min_level > 1 or self.min_coins > 0
+
+    @property
+    def checks_roles(self):
+        return bool(self.required_roles or self.blocked_roles)
+
+    def allows(self, member):
+        role_ids = {role.id for role in member.roles}
+        return self.required_roles <= role_ids and not (self.blocked_roles & role_ids)
+
+    def describe(self):
+        lines = []
+        if self.min_level > 1:
+            lines.append(f"Level {self.min_level}+")
+        if self.min_coins > 0:
+            lines.append(f"{self.min_coins}+ coins")
+        if self.required_roles:
+            lines.append("Roles: " + " ".join(f"<@&{role_id}>" for role_id in sorted(self.required_roles)))
+        if self.blocked_roles:
+            lines.append("Not open to: " + " ".join(f"<@&{role_id}>" for role_id in sorted(self.blocked_roles)))
+        return "\n".join(lines)
+
+def no_winners_message(entrants, requirements):
+    # Entrants below the level or coin thresholds are already left out of the count
+    if entrants or requirements.checks_stats:
+        return "No eligible entrants for the giveaway. 😔"
+    return "No participants for the giveaway. 😔"
+
+async def resolve_member(guild, user_id):
+    """Cached member, else fetched; None if they are no longer in the guild."""
+    member = guild.get_member(user_id)
+    if member is None:
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.HTTPException:
+            return None
+    return member
+
+class EntryBuffer(WriteBehindBuffer):
+    """Queues giveaway entries from reactions and writes them in batches.
+
+    A popular giveaway can get thousands of reactions in its first minute;
+    entries are collected in a set and written with one executemany of
+    INSERT OR IGNORE, so duplicates cost nothing and no row is ever rewritten.
+    """
+
+    name = "giveaway entries"
+
+    def __init__(self, db, max_pending=1000):
+        super().__init__(db, max_pending)
+        self.pending = set()  # (guild_id, message_id, user_id)
+
+    def add(self, guild_id, message_id, user_id):
+        self.pending.add((guild_id, message_id, user_id))
+        self.flush_if_full()
+
+    async def write(self):
+        batch, self.pending = self.pending, set()
+        try:
+            await self.db.executemany(
+                "INSERT OR IGNORE INTO giveaway_entries (guild_id, message_id, user_id) VALUES (?, ?, ?)",
+                list(batch)
+            )
+        except Exception:
+            self.pending |= batch
+            raise
 
 class GiveawayModal(discord.ui.Modal):
-    def __init__(self, bot: commands.Bot, *args, **kwargs) -> None:
+    def __init__(self, cog, mode="entries", *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
-        self.bot = bot
+        self.cog = cog
+        self.bot = cog.bot
+        self.mode = mode
         self.add_item(discord.ui.InputText(label="Duration (e.g., 1s, 1m, 1h, 1d, 1w)", placeholder="1h"))
         self.add_item(discord.ui.InputText(label="Prize", placeholder="The prize of the giveaway"))
         self.add_item(discord.ui.InputText(label="Number of Winners", placeholder="1"))
+        self.add_item(discord.ui.InputText(label="Minimum level / coins (optional)", placeholder="level 5, coins 100", required=False))
+        self.add_item(discord.ui.InputText(label="Required (+) / blocked (-) role IDs (optional)", placeholder="+123456789012345678 -987654321098765432", required=False))
 
     async def callback(self, interaction: discord.Interaction):
         try:
             duration_str = self.children[0].value
             prize = self.children[1].value
             num_winners = int(self.children[2].value)
+            requirements = EntryRequirements.parse(self.children[3].value, self.children[4].value)
 
             duration = self.parse_duration(duration_str)
             if not duration:
@@ -25,27 +147,29 @@ class GiveawayModal(discord.ui.Modal):
                 )
                 return
 
-            end_time = int((datetime.datetime.utcnow() + duration).timestamp())
+            end_time = int(time.time() + duration.total_seconds())
             embed = discord.Embed(
                 title="Giveaway",
                 description=f"Prize: **{prize}**\nReact with 🎉 to enter!\nEnds: <t:{end_time}:R>\nHosted by: {interaction.user.mention}",
                 color=discord.Color.blue()
             )
+            if requirements.describe():
+                embed.add_field(name="Requirements", value=requirements.describe(), inline=False)
             message = await interaction.channel.send(embed=embed)
             await message.add_reaction("🎉")
 
-            await self.add_giveaway(interaction.guild_id, interaction.channel_id, message.id, prize, end_time, num_winners, interaction.user.id)
+            await self.add_giveaway(interaction.guild_id, interaction.channel_id, message.id, prize, end_time, num_winners, interaction.user.id, requirements)
             await interaction.response.send_message("Giveaway started!", ephemeral=True)
         except ValueError:
             await interaction.response.send_message("Invalid input. Ensure all fields are filled correctly.", ephemeral=True)
 
-    async def add_giveaway(self, guild_id, channel_id, message_id, prize, end_time, num_winners, host_id):
-        async with aiosqlite.connect("./db/giveaways.db") as db:
-            await db.execute(f"""
-                INSERT INTO giveaways_{guild_id} (channel_id, message_id, prize, end_time, num_winners, host_id, participants)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (channel_id, message_id, prize, end_time, num_winners, host_id, ""))
-            await db.commit()
+    async def add_giveaway(self, guild_id, channel_id, message_id, prize, end_time, num_winners, host_id, requirements):
+        await self.bot.db.giveaways.execute("""
+            INSERT INTO giveaways (guild_id, channel_id, message_id, prize, end_time, num_winners, host_id, participants, mode,
+                                   min_level, min_coins, required_roles, blocked_roles)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (guild_id, channel_id, message_id, prize, end_time, num_winners, host_id, "", self.mode, *requirements.to_row()))
+        self.cog.track((guild_id, message_id), end_time, self.mode)
 
     def parse_duration(self, duration_str):
         unit = duration_str[-1]
@@ -70,95 +194,216 @@ class GiveawayModal(discord.ui.Modal):
 class Giveaway(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.check_giveaways.start()
-        self.bot.loop.create_task(self.initialize_db())
-
-    async def initialize_db(self):
-        async with aiosqlite.connect("./db/giveaways.db") as db:
-            for guild in self.bot.guilds:
-                await db.execute(f"""
-                    CREATE TABLE IF NOT EXISTS giveaways_{guild.id} (
-                        channel_id INTEGER,
-                        message_id INTEGER,
-                        prize TEXT,
-                        end_time INTEGER,
-                        num_winners INTEGER,
-                        host_id INTEGER,
-                        participants TEXT
-                    )
-                """)
-            await db.commit()
-
-    async def ensure_guild_table(self, guild_id):
-        async with aiosqlite.connect("./db/giveaways.db") as db:
-            await db.execute(f"""
-                CREATE TABLE IF NOT EXISTS giveaways_{guild_id} (
-                    channel_id INTEGER,
-                    message_id INTEGER,
-                    prize TEXT,
-                    end_time INTEGER,
-                    num_winners INTEGER,
-                    host_id INTEGER,
-                    participants TEXT
+        # Keyed by (guild_id, message_id); fires end_giveaway when a giveaway's end_time passes
+        self.scheduler = DeadlineScheduler(self.end_giveaway)
+        self.active = {}  # (guild_id, message_id) -> mode, for giveaways that have not ended
+        self.entries = EntryBuffer(bot.db.giveaways)
+        bot.loop.create_task(self.schedule_pending())
+        self.flush_entries.start()
+        self.prune_entries.start()
+
+    def cog_unload(self):
+        self.scheduler.stop()
+        self.flush_entries.cancel()
+        self.prune_entries.cancel()
+        self.bot.loop.create_task(self.entries.flush())
+
+    async def cog_shutdown(self):
+        self.flush_entries.cancel()
+        await self.entries.flush()
+
+    @tasks.loop(seconds=2)
+    async def flush_entries(self):
+        try:
+            await self.entries.flush()
+        except Exception as e:
+            print(f"Failed to save giveaway entries: {e}")
+
+    @tasks.loop(hours=6)
+    async def prune_entries(self):
+        # Ended giveaways stay for rerolls, but their entries only for ENTRY_RETENTION
+        try:
+            await self.bot.db.giveaways.execute(
+                """
+                DELETE FROM giveaway_entries WHERE (guild_id, message_id) IN (
+                    SELECT guild_id, message_id FROM giveaways WHERE ended = 1 AND end_time < ?
                 )
-            """)
-            await db.commit()
-
-    @tasks.loop(seconds=30)
-    async def check_giveaways(self):
-        now = int(datetime.datetime.utcnow().timestamp())
-        async with aiosqlite.connect("./db/giveaways.db") as db:
-            for guild in self.bot.guilds:
-                await self.ensure_guild_table(guild.id)
-                async with db.execute(
-                    f"SELECT channel_id, message_id, prize, num_winners, participants FROM giveaways_{guild.id} WHERE end_time <= ?", 
-                    (now,)
-                ) as cursor:
-                    rows = await cursor.fetchall()
-                    for row in rows:
-                        channel_id, message_id, prize, num_winners, participants = row
-                        channel = self.bot.get_channel(channel_id)
-                        if not channel:
-                            continue
-
-                        try:
-                            message = await channel.fetch_message(message_id)
-                            participants = participants.split(',') if participants else []
-                            participants = [p for p in participants if int(p) != self.bot.user.id]
-                            if participants:
-                                winners = random.sample(participants, min(num_winners, len(participants)))
-                                winner_mentions = [self.bot.get_guild(guild.id).get_member(int(winner)).mention for winner in winners]
-                                await channel.send(f"Congratulations {', '.join(winner_mentions)}! You won the giveaway for **{prize}**! 🎉")
-                            else:
-                                await channel.send("No participants for the giveaway. 😔")
-                            await message.delete()
-                        except discord.NotFound:
-                            pass
-                        await db.execute(f"DELETE FROM giveaways_{guild.id} WHERE message_id = ?", (message_id,))
-                await db.commit()
-
-    async def add_participant(self, guild_id, message_id, user_id):
-        if user_id == self.bot.user.id:
+                """,
+                (int(time.time()) - ENTRY_RETENTION,)
+            )
+        except Exception as e:
+            print(f"Failed to prune giveaway entries: {e}")
+
+    @prune_entries.before_loop
+    async def before_prune_entries(self):
+        await self.bot.wait_until_ready()
+
+    async def get_participants(self, guild_id, message_id):
+        await self.entries.flush()
+        rows = await self.bot.db.giveaways.fetchall(
+            "SELECT user_id FROM giveaway_entries WHERE guild_id = ? AND message_id = ?",
+            (guild_id, message_id)
+        )
+        return [row[0] for row in rows if row[0] != self.bot.user.id]
+
+    def track(self, key, end_time, mode):
+        self.active[key] = mode
+        self.scheduler.schedule(key, end_time)
+
+    async def schedule_pending(self):
+        await self.bot.wait_until_ready()
+        for guild_id, message_id, end_time, mode in await self.bot.db.giveaways.fetchall(
+            "SELECT guild_id, message_id, end_time, mode FROM giveaways WHERE ended = 0"
+        ):
+            self.track((guild_id, message_id), end_time, mode)
+        self.scheduler.start()
+
+    @commands.Cog.listener()
+    async def on_legacy_migrated(self, guild_ids):
+        await self.schedule_pending()  # Start tracking migrated giveaways
+
+    async def verify_winners(self, guild, candidates, num_winners, requirements):
+        """Take winners from shuffled candidates, skipping anyone who left or fails the role rules.
+
+        Candidates are looked up a batch at a time, each batch sized from how
+        many winners are still missing, until enough pass or the pool runs out.
+        """
+        winners = []
+        position = 0
+        while len(winners) < num_winners and position < len(candidates):
+            missing = num_winners - len(winners)
+            size = min(missing * (10 if requirements.checks_roles else 2) + 5, MAX_VERIFY_BATCH)
+            batch = candidates[position:position + size]
+            position += len(batch)
+            for member in await asyncio.gather(*(resolve_member(guild, user_id) for user_id in batch)):
+                if member is not None and requirements.allows(member):
+                    winners.append(member)
+                    if len(winners) == num_winners:
+                        break
+        return winners
+
+    async def prepare_stats_join(self):
+        # Buffered XP has to be on disk before levels can be joined against
+        exp = self.bot.get_cog("Exp")
+        if exp:
+            await exp.xp_buffer.flush()
+        await self.bot.db.attach("giveaways", "levelsys", "economy")
+
+    async def filter_by_stats(self, guild_id, user_ids, requirements):
+        """Keep the IDs meeting the level and coin thresholds, in one joined query."""
+        if not requirements.checks_stats or not user_ids:
+            return user_ids
+        rows = await self.bot.db.giveaways.fetchall(
+            f"""
+            WITH candidates (user_id) AS (VALUES {", ".join(["(?)"] * len(user_ids))})
+            SELECT candidates.user_id FROM candidates
+            LEFT JOIN levelsys.levels AS l ON l.guild_id = ? AND l.user_id = candidates.user_id
+            LEFT JOIN economy.users AS u ON u.id = candidates.user_id
+            WHERE COALESCE(l.total_xp, 0) >= ? AND COALESCE(u.coins, 0) >= ?
+            """,
+            (*user_ids, guild_id, LEVEL_CURVE.total_xp_for_level(requirements.min_level), requirements.min_coins)
+        )
+        return [row[0] for row in rows]
+
+    async def eligible_entries(self, guild_id, message_id, requirements):
+        if not requirements.checks_stats:
+            return await self.get_participants(guild_id, message_id)
+        await self.entries.flush()
+        rows = await self.bot.db.giveaways.fetchall(
+            """
+            SELECT e.user_id FROM giveaway_entries AS e
+            LEFT JOIN levelsys.levels AS l ON l.guild_id = e.guild_id AND l.user_id = e.user_id
+            LEFT JOIN economy.users AS u ON u.id = e.user_id
+            WHERE e.guild_id = ? AND e.message_id = ? AND COALESCE(l.total_xp, 0) >= ? AND COALESCE(u.coins, 0) >= ?
+            """,
+            (guild_id, message_id, LEVEL_CURVE.total_xp_for_level(requirements.min_level), requirements.min_coins)
+        )
+        return [row[0] for row in rows if row[0] != self.bot.user.id]
+
+    async def eligible_reactors(self, guild_id, reaction, requirements):
+        # Reactions come 100 per page, so each page is filtered with one query
+        page = []
+        async for user in reaction.users(limit=None):
+            if user.bot:
+                continue
+            page.append(user.id)
+            if len(page) == 100:
+                for user_id in await self.filter_by_stats(guild_id, page, requirements):
+                    yield user_id
+                page = []
+        for user_id in await self.filter_by_stats(guild_id, page, requirements):
+            yield user_id
+
+    async def draw_winners(self, guild, message, mode, num_winners, requirements):
+        """Return (winners, how many entrants met the level and coin thresholds)."""
+        if requirements.checks_stats:
+            await self.prepare_stats_join()
+        if mode == "harvest":
+            reaction = discord.utils.get(message.reactions, emoji="🎉")
+            if reaction is None:
+                return [], 0
+            candidates = [user_id async for user_id in self.eligible_reactors(guild.id, reaction, requirements)]
+        else:
+            candidates = await self.eligible_entries(guild.id, message.id, requirements)
+        random.shuffle(candidates)
+        return await self.verify_winners(guild, candidates, num_winners, requirements), len(candidates)
+
+    async def end_giveaway(self, key):
+        guild_id, message_id = key
+        self.active.pop(key, None)
+        db = self.bot.db.giveaways
+        # Claim the giveaway before drawing, so /giveaway end during a long draw can't start a second one
+        cursor = await db.execute(
+            "UPDATE giveaways SET ended = 1 WHERE guild_id = ? AND message_id = ? AND ended = 0", (guild_id, message_id)
+        )
+        if cursor.rowcount == 0:
             return
+        row = await db.fetchone(
+            """
+            SELECT channel_id, prize, num_winners, mode, min_level, min_coins, required_roles, blocked_roles
+            FROM giveaways WHERE guild_id = ? AND message_id = ?
+            """,
+            (guild_id, message_id)
+        )
+        channel_id, prize, num_winners, mode = row[:4]
+        requirements = EntryRequirements.from_row(*row[4:])
+        channel = self.bot.get_channel(channel_id)
+        if channel:
+            try:
+                message = await channel.fetch_message(message_id)
+                winners, entrants = await self.draw_winners(channel.guild, message, mode, num_winners, requirements)
+                if winners:
+                    winner_mentions = [winner.mention for winner in winners]
+                    await channel.send(f"Congratulations {', '.join(winner_mentions)}! You won the giveaway for **{prize}**! 🎉")
+                else:
+                    await channel.send(no_winners_message(entrants, requirements))
+                # Keep the message (and its reactions) so the giveaway can be rerolled
+                embed = discord.Embed(
+                    title="Giveaway Ended",
+                    description=f"Prize: **{prize}**\nWinners: {', '.join(winner.mention for winner in winners) or 'None'}",
+                    color=discord.Color.dark_grey()
+                )
+                await message.edit(embed=embed)
+            except discord.NotFound:
+                pass
 
-        async with aiosqlite.connect("./db/giveaways.db") as db:
-            await self.ensure_guild_table(guild_id)
-            async with db.execute(f"SELECT participants FROM giveaways_{guild_id} WHERE message_id = ?", (message_id,)) as cursor:
-                row = await cursor.fetchone()
-                if row:
-                    participants = row[0].split(',') if row[0] else []
-                    if str(user_id) not in participants:
-                        participants.append(str(user_id))
-                        await db.execute(f"UPDATE giveaways_{guild_id} SET participants = ? WHERE message_id = ?", (','.join(participants), message_id))
-                        await db.commit()
+    def add_participant(self, guild_id, message_id, user_id):
+        if user_id == self.bot.user.id:
+            return
+        # Harvest giveaways read their reactions at draw time, so nothing is stored per reaction
+        if self.active.get((guild_id, message_id)) == "entries":
+            self.entries.add(guild_id, message_id, user_id)
 
     giveaway = discord.SlashCommandGroup(name="giveaway", description="Manage giveaways")
 
     @giveaway.command(name="setup", description="Setup a new giveaway")
     @commands.has_permissions(administrator=True)
-    async def giveaway_setup(self, ctx):
-        await self.ensure_guild_table(ctx.guild.id)
-        modal = GiveawayModal(self.bot, title="Giveaway Setup")
+    async def giveaway_setup(
+        self,
+        ctx,
+        mode: discord.Option(str, "entries records each reaction; harvest reads the reactions when the giveaway ends", choices=list(GIVEAWAY_MODES), default="entries")
+    ):
+        modal = GiveawayModal(self, mode, title="Giveaway Setup")
         await ctx.send_modal(modal)
 
     @giveaway.command(name="end", description="End an active giveaway")
@@ -166,58 +411,65 @@ class Giveaway(commands.Cog):
     async def giveaway_end(self, ctx, message_id: discord.Option(str, description="The ID of the giveaway message")):
         try:
             message_id = int(message_id)
-            async with aiosqlite.connect("./db/giveaways.db") as db:
-                await self.ensure_guild_table(ctx.guild.id)
-                await db.execute(f"UPDATE giveaways_{ctx.guild.id} SET end_time = ? WHERE message_id = ?", (int(datetime.datetime.utcnow().timestamp()), message_id))
-                await db.commit()
+            now = int(time.time())
+            cursor = await self.bot.db.giveaways.execute("UPDATE giveaways SET end_time = ? WHERE guild_id = ? AND message_id = ? AND ended = 0", (now, ctx.guild.id, message_id))
+            if cursor.rowcount == 0:
+                return await ctx.respond("No active giveaway found with that message ID.", ephemeral=True)
+            self.scheduler.schedule((ctx.guild.id, message_id), now)
             await ctx.respond("The giveaway will end shortly.", ephemeral=True)
         except ValueError:
             await ctx.respond("Invalid message ID. Provide a valid integer.", ephemeral=True)
 
     @giveaway.command(name="list", description="List all active giveaways")
     async def giveaway_list(self, ctx):
-        async with aiosqlite.connect("./db/giveaways.db") as db:
-            await self.ensure_guild_table(ctx.guild.id)
-            async with db.execute(f"SELECT channel_id, message_id, prize, end_time FROM giveaways_{ctx.guild.id}") as cursor:
-                rows = await cursor.fetchall()
-                if not rows:
-                    return await ctx.respond("No active giveaways at the moment.", ephemeral=True)
-
-                embed = discord.Embed(title="Active Giveaways", color=discord.Color.blue())
-                for row in rows:
-                    channel_id, message_id, prize, end_time = row
-                    end_time_str = datetime.datetime.fromtimestamp(end_time).strftime('%Y-%m-%d %H:%M:%S UTC')
-                    embed.add_field(name=f"Giveaway in <#{channel_id}>", value=f"Prize: **{prize}**\nEnds: {end_time_str}\n[Message Link](https://discord.com/channels/{ctx.guild.id}/{channel_id}/{message_id})", inline=False)
-                await ctx.respond(embed=embed, ephemeral=True)
+        rows = await self.bot.db.giveaways.fetchall("SELECT channel_id, message_id, prize, end_time FROM giveaways WHERE guild_id = ? AND ended = 0", (ctx.guild.id,))
+        if not rows:
+            return await ctx.respond("No active giveaways at the moment.", ephemeral=True)
+
+        embed = discord.Embed(title="Active Giveaways", color=discord.Color.blue())
+        for row in rows:
+            channel_id, message_id, prize, end_time = row
+            end_time_str = datetime.datetime.fromtimestamp(end_time, datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+            embed.add_field(name=f"Giveaway in <#{channel_id}>", value=f"Prize: **{prize}**\nEnds: {end_time_str}\n[Message Link](https://discord.com/channels/{ctx.guild.id}/{channel_id}/{message_id})", inline=False)
+        await ctx.respond(embed=embed, ephemeral=True)
 
     @giveaway.command(name="reroll", description="Reroll the winners of a giveaway")
     @commands.has_permissions(administrator=True)
     async def giveaway_reroll(self, ctx, message_id: discord.Option(str, description="The ID of the giveaway message")):
         try:
             message_id = int(message_id)
-            async with aiosqlite.connect("./db/giveaways.db") as db:
-                await self.ensure_guild_table(ctx.guild.id)
-                async with db.execute(f"SELECT participants, prize, num_winners FROM giveaways_{ctx.guild.id} WHERE message_id = ?", (message_id,)) as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        participants, prize, num_winners = row
-                        participants = participants.split(',') if participants else []
-                        participants = [p for p in participants if int(p) != self.bot.user.id]
-                        if participants:
-                            winners = random.sample(participants, min(num_winners, len(participants)))
-                            winner_mentions = [ctx.guild.get_member(int(winner)).mention for winner in winners]
-                            await ctx.respond(f"Congratulations {', '.join(winner_mentions)}! You won the giveaway for **{prize}**! 🎉", ephemeral=True)
-                        else:
-                            await ctx.respond("No participants for the giveaway. 😔", ephemeral=True)
-                    else:
-                        await ctx.respond("No giveaway found with that message ID.", ephemeral=True)
+            row = await self.bot.db.giveaways.fetchone(
+                "SELECT channel_id, prize, num_winners, mode, ended, end_time, min_level, min_coins, required_roles, blocked_roles FROM giveaways WHERE guild_id = ? AND message_id = ?",
+                (ctx.guild.id, message_id)
+            )
+            if row:
+                channel_id, prize, num_winners, mode, ended, end_time = row[:6]
+                requirements = EntryRequirements.from_row(*row[6:])
+                if mode == "entries" and ended and end_time < time.time() - ENTRY_RETENTION:
+                    return await ctx.respond("The entries of this giveaway have been cleared, so it can no longer be rerolled.", ephemeral=True)
+                channel = ctx.guild.get_channel(channel_id)
+                try:
+                    message = await channel.fetch_message(message_id) if channel else None
+                except discord.NotFound:
+                    message = None
+                if message is None:
+                    return await ctx.respond("The giveaway message no longer exists.", ephemeral=True)
+                await ctx.defer(ephemeral=True)
+                winners, entrants = await self.draw_winners(ctx.guild, message, mode, num_winners, requirements)
+                if winners:
+                    winner_mentions = [winner.mention for winner in winners]
+                    await ctx.respond(f"Congratulations {', '.join(winner_mentions)}! You won the giveaway for **{prize}**! 🎉", ephemeral=True)
+                else:
+                    await ctx.respond(no_winners_message(entrants, requirements), ephemeral=True)
+            else:
+                await ctx.respond("No giveaway found with that message ID.", ephemeral=True)
         except ValueError:
             await ctx.respond("Invalid message ID. Provide a valid integer.", ephemeral=True)
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
         if payload.emoji.name == "🎉" and not payload.user_id == self.bot.user.id:
-            await self.add_participant(payload.guild_id, payload.message_id, payload.user_id)
+            self.add_participant(payload.guild_id, payload.message_id, payload.user_id)
 
 def setup(bot):
     bot.add_cog(Giveaway(bot))
@@ -1,115 +1,138 @@
 import discord
-from discord.ext import commands
-import aiosqlite
-import aiohttp
+from discord.ext import commands, tasks
+import asyncio
+import contextlib
 import random
 import time
-import json
-import os
+import numpy as np
+from utils.levels import LEVEL_CURVE
+from utils.leaderboard import LeaderboardView
+from utils.buffer import WriteBehindBuffer
+from utils.cache import LazyCache, by_guild
+from utils.progress import InteractionProgress
+
+ROLE_SYNC_CHUNK = 1000  # Level rows read per query while syncing level roles
+
+class XPBuffer(WriteBehindBuffer):
+    """Keeps recent XP gains in memory and writes them to levelsys.db in batches."""
+
+    name = "XP"
+
+    def __init__(self, db, curve=LEVEL_CURVE, max_pending=500, on_update=None):
+        super().__init__(db, max_pending)
+        self.curve = curve
+        self.on_update = on_update  # Called with (guild_id, user_id, total XP) after every gain
+        self.pending = {}  # (guild_id, user_id) -> total XP, not yet written
+        self.bases = {}  # (guild_id, user_id) -> stored total that pending gains were added to
+        self.flushing = {}  # Batch currently being written
+
+    async def get_total(self, guild_id, user_id):
+        key = (guild_id, user_id)
+        if key in self.pending:
+            return self.pending[key]
+        if key in self.flushing:
+            return self.flushing[key]
+        row = await self.db.fetchone(
+            "SELECT total_xp FROM levels WHERE guild_id = ? AND user_id = ?",
+            (guild_id, user_id)
+        )
+        return row[0] if row else 0
+
+    async def add(self, guild_id, user_id, xp_gain):
+        key = (guild_id, user_id)
+        if key not in self.pending:
+            total = await self.get_total(guild_id, user_id)
+            if key not in self.pending:
+                self.pending[key] = self.bases[key] = total
+        old_level = self.curve.level_for_xp(self.pending[key])
+        self.pending[key] += xp_gain
+        new_level = self.curve.level_for_xp(self.pending[key])
+        if self.on_update:
+            self.on_update(guild_id, user_id, self.pending[key])
+
+        self.flush_if_full()
+        return new_level > old_level, new_level
+
+    async def write(self):
+        self.flushing, self.pending = self.pending, {}
+        bases, self.bases = self.bases, {}
+        rows = []
+        for (guild_id, user_id), total in self.flushing.items():
+            xp, level = self.curve.progress(total)
+            rows.append((guild_id, user_id, xp, level, total))
+        try:
+            await self.db.executemany(
+                """
+                INSERT INTO levels (guild_id, user_id, xp, level, total_xp) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (guild_id, user_id) DO UPDATE SET
+                    xp = excluded.xp, level = excluded.level, total_xp = excluded.total_xp
+                """,
+                rows
+            )
+        except Exception:
+            # Keep the batch so the next flush retries it; newer gains win
+            for key, total in self.flushing.items():
+                if key not in self.pending:
+                    self.pending[key] = total
+                    self.bases[key] = bases[key]
+            raise
+        finally:
+            self.flushing = {}
+
+    @contextlib.asynccontextmanager
+    async def paused(self):
+        """Write everything out, then hold writes while something else changes stored totals.
+
+        Gains made meanwhile stay in memory and are re-applied on top of the
+        stored totals when the block ends, so neither side overwrites the other.
+        """
+        await self.flush()
+        async with self.flush_lock:
+            try:
+                yield
+            finally:
+                for key in list(self.pending):
+                    row = await self.db.fetchone(
+                        "SELECT total_xp FROM levels WHERE guild_id = ? AND user_id = ?", key
+                    )
+                    stored = row[0] if row else 0
+                    self.pending[key] += stored - self.bases[key]
+                    self.bases[key] = stored
 
 class Exp(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.cooldown = {}
         self.xp_cooldown = 120  # Cooldown time in seconds
-        self.username_cache = {}
-        self.username_cache_file = "./temp/username_cache.json"
-        self.level_roles = {}  # Dictionary to store level-based roles
-        self.load_username_cache()
-
-    def load_username_cache(self):
-        if os.path.exists(self.username_cache_file):
-            with open(self.username_cache_file, 'r') as f:
-                self.username_cache = json.load(f)
-        else:
-            self.username_cache = {}
+        self.level_roles = LazyCache(self.load_level_roles)  # guild_id -> {level: role_id}; mirrors the level_roles table
+        self.xp_buffer = XPBuffer(bot.db.levelsys, on_update=bot.leaderboards.record_xp)
+        self.flush_xp.start()
+        bot.pipeline.register("exp", self.check_message)
 
-    def save_username_cache(self):
-        with open(self.username_cache_file, 'w') as f:
-            json.dump(self.username_cache, f)
+    def cog_unload(self):
+        self.bot.pipeline.unregister("exp")
+        self.flush_xp.cancel()
+        self.bot.loop.create_task(self.xp_buffer.flush())
 
-    async def create_user_table(self, guild_id):
-        table_name = f"users_{guild_id}"
-        async with aiosqlite.connect("./db/levelsys.db") as db:
-            await db.execute(
-                f"CREATE TABLE IF NOT EXISTS {table_name} (id INTEGER, guild_id INTEGER, xp INTEGER, level INTEGER, PRIMARY KEY (id, guild_id))"
-            )
-            await db.commit()
+    async def cog_shutdown(self):
+        self.flush_xp.cancel()
+        await self.xp_buffer.flush()
+
+    @tasks.loop(seconds=5)
+    async def flush_xp(self):
+        try:
+            await self.xp_buffer.flush()
+        except Exception as e:
+            print(f"Failed to flush XP buffer: {e}")
 
     async def get_user_data(self, guild_id, user_id):
-        await self.create_user_table(guild_id)
-        table_name = f"users_{guild_id}"
-        async with aiosqlite.connect("./db/levelsys.db") as db:
-            async with db.execute(
-                f"SELECT xp, level FROM {table_name} WHERE id = ? AND guild_id = ?",
-                (user_id, guild_id)
-            ) as cursor:
-                row = await cursor.fetchone()
-                if row:
-                    xp, level = row
-                else:
-                    xp, level = 0, 1
-                    await db.execute(
-                        f"INSERT INTO {table_name} (id, guild_id, xp, level) VALUES (?, ?, ?, ?)",
-                        (user_id, guild_id, xp, level)
-                    )
-                    await db.commit()
-                return xp, level
+        return LEVEL_CURVE.progress(await self.xp_buffer.get_total(guild_id, user_id))
 
     async def update_user_data(self, guild_id, user_id, xp_gain):
-        await self.create_user_table(guild_id)
-        table_name = f"users_{guild_id}"
-        async with aiosqlite.connect("./db/levelsys.db") as db:
-            async with db.execute(
-                f"SELECT xp, level FROM {table_name} WHERE id = ? AND guild_id = ?",
-                (user_id, guild_id)
-            ) as cursor:
-                row = await cursor.fetchone()
-                if row:
-                    current_xp, current_level = row
-                    new_xp = current_xp + xp_gain
-                    required_xp = 100 * current_level
-                    leveled_up = False
-                    while new_xp >= required_xp:
-                        new_xp -= required_xp
-                        current_level += 1
-                        required_xp = 100 * current_level
-                        leveled_up = True
-                    await db.execute(
-                        f"UPDATE {table_name} SET xp = ?, level = ? WHERE id = ? AND guild_id = ?",
-                        (new_xp, current_level, user_id, guild_id)
-                    )
-                    await db.commit()
-                    return leveled_up, current_level
-                else:
-                    await db.execute(
-                        f"INSERT INTO {table_name} (id, guild_id, xp, level) VALUES (?, ?, ?, ?)",
-                        (user_id, guild_id, xp_gain, 1)
-                    )
-                    await db.commit()
-                    return False, 1
-
-    async def fetch_username(self, user_id):
-        if user_id in self.username_cache:
-            return self.username_cache[user_id]
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"https://discordlookup.mesalytic.moe/v1/user/{user_id}") as resp:
-                if resp.status == 200:
-                    user_data = await resp.json()
-                    username = user_data.get("username", f"User: {user_id}")
-                else:
-                    username = f"User: {user_id}"
-
-        self.username_cache[user_id] = username
-        self.save_username_cache()
-        return username
-
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot or not message.guild:
-            return
+        return await self.xp_buffer.add(guild_id, user_id, xp_gain)
 
+    async def check_message(self, context):
+        message = context.message
         current_time = time.time()
         guild_id = message.guild.id
         user_id = message.author.id
@@ -132,12 +155,36 @@ class Exp(commands.Cog):
             level_up_message = await message.channel.send(embed=embed)
             await level_up_message.delete(delay=10)
 
+    async def load_level_roles(self):
+        return by_guild(await self.bot.db.levelsys.fetchall("SELECT guild_id, level, role_id FROM level_roles"))
+
+    async def get_level_roles(self, guild_id):
+        return (await self.level_roles.get()).setdefault(guild_id, {})
+
+    async def set_level_role(self, guild_id, level, role_id):
+        await self.bot.db.levelsys.execute(
+            """
+            INSERT INTO level_roles (guild_id, level, role_id) VALUES (?, ?, ?)
+            ON CONFLICT (guild_id, level) DO UPDATE SET role_id = excluded.role_id
+            """,
+            (guild_id, level, role_id)
+        )
+        (await self.get_level_roles(guild_id))[level] = role_id
+
+    async def remove_level_role(self, guild_id, level):
+        await self.bot.db.levelsys.execute(
+            "DELETE FROM level_roles WHERE guild_id = ? AND level = ?", (guild_id, level)
+        )
+        return (await self.get_level_roles(guild_id)).pop(level, None)
+
     async def assign_roles_based_on_level(self, guild, member, new_level):
-        if guild.id in self.level_roles:
-            for level, role_id in self.level_roles[guild.id].items():
-                role = guild.get_role(role_id)
-                if role and new_level >= level:
-                    await member.add_roles(role, reason=f"Leveled up to {new_level}")
+        level_roles = await self.get_level_roles(guild.id)
+        if level_roles:
+            roles = [
+                guild.get_role(role_id) for level, role_id in level_roles.items() if new_level >= level
+            ]
+            # Roles the member already has are dropped by the queue, which merges the rest into one call
+            self.bot.roles.add(member, *filter(None, roles), reason=f"Leveled up to {new_level}")
 
     exp = discord.SlashCommandGroup(name="exp", description="Experience points commands")
 
@@ -170,63 +217,178 @@ class Exp(commands.Cog):
         embed.set_footer(text="Requested by " + ctx.author.display_name, icon_url=ctx.author.avatar.url if ctx.author.avatar else "https://i.postimg.cc/fLQ8T6F6/NO-USER.png")
         await ctx.respond(embed=embed)
 
-    @exp.command(name="leaderboard", description="Show the leaderboard for XP and levels")
-    async def leaderboard(self, ctx):
-        table_name = f"users_{ctx.guild.id}"
-        async with aiosqlite.connect("./db/levelsys.db") as db:
-            async with db.execute(
-                f"SELECT id, xp, level FROM {table_name} ORDER BY level DESC, xp DESC LIMIT 10"
-            ) as cursor:
-                leaderboard_data = await cursor.fetchall()
-        
+    async def get_leaderboard(self, guild_id):
+        return await self.bot.leaderboards.get_levels(guild_id, before_load=self.xp_buffer.flush)
+
+    async def render_leaderboard_page(self, entries, first_rank):
         embed = discord.Embed(
             title="Leaderboard: XP and Levels",
             color=discord.Color.gold()
         )
-
-        if not leaderboard_data:
+        if not entries:
             embed.description = "No data available."
-        else:
-            async with aiohttp.ClientSession() as session:
-                for idx, (user_id, xp, level) in enumerate(leaderboard_data, start=1):
-                    username = await self.fetch_username(user_id)
-                    embed.add_field(
-                        name=f"#{idx}: {username}",
-                        value=f"Level **{level}** with **{xp}** XP",
-                        inline=False
-                    )
+        usernames = await self.bot.usernames.resolve_many(user_id for user_id, _ in entries)
+        for rank, (user_id, total_xp) in enumerate(entries, start=first_rank):
+            xp, level = LEVEL_CURVE.progress(total_xp)
+            embed.add_field(
+                name=f"#{rank}: {usernames[user_id]}",
+                value=f"Level **{level}** with **{xp}** XP",
+                inline=False
+            )
+        return embed
+
+    @exp.command(name="leaderboard", description="Show the leaderboard for XP and levels")
+    async def leaderboard(self, ctx):
+        board = await self.get_leaderboard(ctx.guild.id)
+
+        async def fetch_page(**cursor):
+            await self.xp_buffer.flush()
+            return await self.bot.leaderboards.fetch_levels_page(ctx.guild.id, **cursor)
 
+        view = LeaderboardView(ctx.author, board, fetch_page, self.render_leaderboard_page)
+        embed = await view.load(0)
+        await ctx.respond(embed=embed, view=view)
+
+    @exp.command(name="rank", description="Show a user's position on the XP leaderboard")
+    async def rank(self, ctx, member: discord.Member = None):
+        member = member or ctx.author
+        board = await self.get_leaderboard(ctx.guild.id)
+        rank = board.rank(member.id)
+        if rank is None:
+            description = f"{member.display_name} has not earned any XP yet."
+        else:
+            xp, level = LEVEL_CURVE.progress(board.score(member.id))
+            description = f"{member.display_name} is ranked **#{rank}** of {len(board)} at level **{level}** with **{xp}** XP."
+        embed = discord.Embed(
+            title="XP Rank",
+            description=description,
+            color=discord.Color.gold()
+        )
         embed.set_footer(text="Requested by " + ctx.author.display_name, icon_url=ctx.author.avatar.url if ctx.author.avatar else "https://i.postimg.cc/fLQ8T6F6/NO-USER.png")
         await ctx.respond(embed=embed)
 
+    def hold_xp(self):
+        """Async context manager holding XP writes while stored totals are changed elsewhere."""
+        return self.xp_buffer.paused()
+
+    @commands.Cog.listener()
+    async def on_legacy_migrated(self, guild_ids):
+        # Migrated rows only carry total XP; derive their levels
+        for guild_id in guild_ids:
+            await self.recalculate_levels(guild_id)
+
+    async def recalculate_levels(self, guild_id):
+        """Rewrite every stored level and XP value for a guild from its total XP."""
+        await self.xp_buffer.flush()
+        db = self.bot.db.levelsys
+        rows = await db.fetchall("SELECT user_id, total_xp FROM levels WHERE guild_id = ?", (guild_id,))
+        if not rows:
+            return 0
+        data = np.array(rows, dtype=np.int64)
+        xp, levels = LEVEL_CURVE.bulk_progress(data[:, 1])
+        await db.executemany(
+            "UPDATE levels SET xp = ?, level = ? WHERE guild_id = ? AND user_id = ?",
+            zip(xp.tolist(), levels.tolist(), [guild_id] * len(rows), data[:, 0].tolist())
+        )
+        return len(rows)
+
+    @exp.command(name="recalculate", description="Recalculate every member's level from their total XP")
+    @commands.has_permissions(administrator=True)
+    async def recalculate(self, ctx):
+        await ctx.defer(ephemeral=True)
+        count = await self.recalculate_levels(ctx.guild.id)
+        embed = discord.Embed(
+            title="Levels Recalculated",
+            description=f"Recalculated levels for {count} members.",
+            color=discord.Color.green()
+        )
+        await ctx.respond(embed=embed, ephemeral=True)
+
+    async def sync_level_roles(self, guild, progress=None):
+        """Give cached members every level role they have earned but lack. Returns (checked, updated).
+
+        Level rows are read ROLE_SYNC_CHUNK at a time by user ID, skipping
+        anyone below the lowest rewarded level; the role changes go through
+        bot.roles, and each chunk waits for its edits before the next is read.
+        """
+        rewards = sorted(
+            (level, guild.get_role(role_id)) for level, role_id in (await self.get_level_roles(guild.id)).items()
+        )
+        rewards = [(level, role) for level, role in rewards if role is not None]
+        if not rewards:
+            return 0, 0
+        await self.xp_buffer.flush()
+        min_total_xp = LEVEL_CURVE.total_xp_for_level(rewards[0][0])
+        checked = updated = 0
+        last_user_id = -1
+        while True:
+            rows = await self.bot.db.levelsys.fetchall(
+                """
+                SELECT user_id, total_xp FROM levels
+                WHERE guild_id = ? AND user_id > ? AND total_xp >= ?
+                ORDER BY user_id LIMIT ?
+                """,
+                (guild.id, last_user_id, min_total_xp, ROLE_SYNC_CHUNK)
+            )
+            if not rows:
+                break
+            last_user_id = rows[-1][0]
+            edits = []
+            for user_id, total_xp in rows:
+                member = guild.get_member(user_id)
+                if member is None:
+                    continue
+                level = LEVEL_CURVE.level_for_xp(total_xp)
+                held = {role.id for role in member.roles}
+                missing = [role for reward_level, role in rewards if reward_level <= level and role.id not in held]
+                if missing:
+                    edits.append(self.bot.roles.add(member, *missing, reason="Level role sync"))
+            checked += len(rows)
+            updated += sum(await asyncio.gather(*edits))
+            if progress:
+                await progress(checked, updated)
+        return checked, updated
+
     @exp.command(name="roles", description="Manage roles for levels")
     @commands.has_permissions(manage_roles=True)
     async def level_roles(self, ctx, action: str, level: int = None, role: discord.Role = None):
         if action == "give" and level is not None and role is not None:
-            if ctx.guild.id not in self.level_roles:
-                self.level_roles[ctx.guild.id] = {}
-            self.level_roles[ctx.guild.id][level] = role.id
+            await self.set_level_role(ctx.guild.id, level, role.id)
             await ctx.respond(f"Assigned role {role.name} for level {level}.")
         elif action == "remove" and level is not None:
-            if ctx.guild.id in self.level_roles and level in self.level_roles[ctx.guild.id]:
-                del self.level_roles[ctx.guild.id][level]
+            if await self.remove_level_role(ctx.guild.id, level) is not None:
                 await ctx.respond(f"Removed role assignment for level {level}.")
             else:
                 await ctx.respond("No role assignment found for that level.")
+        elif action == "sync":
+            await ctx.defer()
+            report = InteractionProgress(ctx)
+
+            async def report_progress(checked, updated):
+                await report.update(f"Checked {checked} members, updated {updated} so far...")
+
+            checked, updated = await self.sync_level_roles(ctx.guild, progress=report_progress)
+            embed = discord.Embed(
+                title="Level Roles Synced",
+                description=f"Checked {checked} members with XP and gave missing level roles to {updated}.",
+                color=discord.Color.green()
+            )
+            await report.finish(embed)
         elif action == "list":
             embed = discord.Embed(
                 title="Level Role Assignments",
                 color=discord.Color.purple()
             )
-            if ctx.guild.id in self.level_roles and self.level_roles[ctx.guild.id]:
-                for level, role_id in self.level_roles[ctx.guild.id].items():
+            level_roles = await self.get_level_roles(ctx.guild.id)
+            if level_roles:
+                for level, role_id in sorted(level_roles.items()):
                     role = ctx.guild.get_role(role_id)
                     embed.add_field(name=f"Level {level}", value=role.name if role else "Role not found", inline=False)
             else:
                 embed.description = "No role assignments found."
             await ctx.respond(embed=embed)
         else:
-            await ctx.respond("Invalid action. Use `give`, `remove`, or `list`.")
+            await ctx.respond("Invalid action. Use `give`, `remove`, `sync`, or `list`.")
 
 def setup(bot):
     bot.add_cog(Exp(bot))
@@ -3,13 +3,16 @@ from discord.ext import commands
 import os
 from dotenv import load_dotenv
 import datetime
-import aiosqlite
 
 load_dotenv("../.env")
 
 class Mod(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        bot.joins.register("mod", self.check_invites)
+
+    def cog_unload(self):
+        self.bot.joins.unregister("mod")
 
     async def send_embed(self, ctx, title, description, color):
         embed = discord.Embed(
@@ -89,47 +92,28 @@ class Mod(commands.Cog):
 
     ## WARNING SYSTEM
 
-    async def create_warn_table(self, guild_id):
-        table_name = f"warns_{guild_id}"
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute(
-                f"CREATE TABLE IF NOT EXISTS {table_name} (user_id INTEGER, reason TEXT)"
-            )
-            await db.commit()
-
     async def add_warn(self, guild_id, user_id, reason):
-        table_name = f"warns_{guild_id}"
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute(
-                f"INSERT INTO {table_name} (user_id, reason) VALUES (?, ?)",
-                (user_id, reason)
-            )
-            await db.commit()
+        await self.bot.db.configs.execute(
+            "INSERT INTO warns (guild_id, user_id, reason) VALUES (?, ?, ?)",
+            (guild_id, user_id, reason)
+        )
 
     async def get_warns(self, guild_id, user_id):
-        table_name = f"warns_{guild_id}"
-        async with aiosqlite.connect("./db/configs.db") as db:
-            async with db.execute(
-                f"SELECT rowid, reason FROM {table_name} WHERE user_id = ?",
-                (user_id,)
-            ) as cursor:
-                rows = await cursor.fetchall()
-                return rows
+        return await self.bot.db.configs.fetchall(
+            "SELECT id, reason FROM warns WHERE guild_id = ? AND user_id = ?",
+            (guild_id, user_id)
+        )
 
     async def remove_warn(self, guild_id, user_id, warn_id):
-        table_name = f"warns_{guild_id}"
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute(
-                f"DELETE FROM {table_name} WHERE rowid = ? AND user_id = ?",
-                (warn_id, user_id)
-            )
-            await db.commit()
+        await self.bot.db.configs.execute(
+            "DELETE FROM warns WHERE id = ? AND guild_id = ? AND user_id = ?",
+            (warn_id, guild_id, user_id)
+        )
 
     warn = discord.SlashCommandGroup(name="warn", description="Warning commands")
 
     @warn.command(name="user", description="Warn a user")
     async def warn_user(self, ctx, user: discord.User, *, reason: str):
-        await self.create_warn_table(ctx.guild.id)
         await self.add_warn(ctx.guild.id, user.id, reason)
 
         embed = discord.Embed(
@@ -141,7 +125,6 @@ class Mod(commands.Cog):
 
     @warn.command(name="list", description="List warnings for a user")
     async def warn_list(self, ctx, user: discord.User):
-        await self.create_warn_table(ctx.guild.id)
         warns = await self.get_warns(ctx.guild.id, user.id)
 
         if warns:
@@ -162,7 +145,6 @@ class Mod(commands.Cog):
 
     @warn.command(name="remove", description="Remove a specific warning from a user")
     async def warn_remove(self, ctx, user: discord.User, warn_id: int):
-        await self.create_warn_table(ctx.guild.id)
         warns = await self.get_warns(ctx.guild.id, user.id)
 
         if any(warn[0] == warn_id for warn in warns):
@@ -183,45 +165,27 @@ class Mod(commands.Cog):
 
     ## INVITE-BASED AUTO-BANNING SYSTEM
 
-    async def create_invite_table(self, guild_id):
-        table_name = f"invite_config_{guild_id}"
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute(
-                f"CREATE TABLE IF NOT EXISTS {table_name} (invite_count INTEGER)"
-            )
-            await db.commit()
-
     async def get_invite_threshold(self, guild_id):
-        table_name = f"invite_config_{guild_id}"
-        async with aiosqlite.connect("./db/configs.db") as db:
-            async with db.execute(
-                f"SELECT invite_count FROM {table_name}"
-            ) as cursor:
-                row = await cursor.fetchone()
-                return row[0] if row else None
+        row = await self.bot.db.configs.fetchone(
+            "SELECT invite_count FROM invite_config WHERE guild_id = ?",
+            (guild_id,)
+        )
+        return row[0] if row else None
 
     async def set_invite_threshold(self, guild_id, count):
-        table_name = f"invite_config_{guild_id}"
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute(
-                f"DELETE FROM {table_name}"
-            )
-            await db.execute(
-                f"INSERT INTO {table_name} (invite_count) VALUES (?)",
-                (count,)
-            )
-            await db.commit()
+        await self.bot.db.configs.execute(
+            "INSERT OR REPLACE INTO invite_config (guild_id, invite_count) VALUES (?, ?)",
+            (guild_id, count)
+        )
 
     @discord.slash_command(name="set_invite_threshold", description="Set the invite threshold for auto-banning.")
     @commands.has_permissions(administrator=True)
     async def set_invite_threshold_command(self, ctx, count: int):
-        await self.create_invite_table(ctx.guild.id)
         await self.set_invite_threshold(ctx.guild.id, count)
         await self.send_embed(ctx, "Invite Threshold Set", f"Invite threshold has been set to {count}.", discord.Color.green())
 
     @discord.slash_command(name="view_invite_threshold", description="View the current invite threshold.")
     async def view_invite_threshold(self, ctx):
-        await self.create_invite_table(ctx.guild.id)
         threshold = await self.get_invite_threshold(ctx.guild.id)
 
         if threshold is not None:
@@ -229,22 +193,19 @@ class Mod(commands.Cog):
         else:
             await self.send_embed(ctx, "No Threshold Set", "No invite threshold is currently set.", discord.Color.red())
 
-    async def check_invites(self, member):
-        async with aiosqlite.connect("./db/configs.db") as db:
-            table_name = f"invite_config_{member.guild.id}"
-            threshold = await db.execute(f"SELECT invite_count FROM {table_name}")
-            threshold = await threshold.fetchone()
-            if threshold:
-                threshold = threshold[0]
-                # Get invite counts for the member
-                invites = await member.guild.invites()
-                invite_count = sum(invite.uses for invite in invites if invite.inviter == member)
-                if invite_count >= threshold:
+    async def check_invites(self, batch):
+        threshold = await self.get_invite_threshold(batch.guild.id)
+        if threshold is not None:
+            # Count invite uses per inviter once for the whole batch of joins
+            invites = await self.bot.invites.snapshot(batch.guild)
+            invite_counts = {}
+            for invite in invites.values():
+                if invite.inviter:
+                    invite_counts[invite.inviter.id] = invite_counts.get(invite.inviter.id, 0) + (invite.uses or 0)
+            for member in batch.members:
+                if invite_counts.get(member.id, 0) >= threshold:
                     await member.ban(reason="Exceeded invite threshold")
-
-    @commands.Cog.listener()
-    async def on_member_join(self, member):
-        await self.check_invites(member)
+                    batch.drop(member)
 
 def setup(bot):
     bot.add_cog(Mod(bot))
@@ -1,28 +1,57 @@
 import discord
 from discord.ext import commands
 from discord.commands import SlashCommandGroup
-import aiosqlite
+import asyncio
+from utils.cache import LazyCache, by_guild
+
+PING_WINDOW = 30  # A channel pings its role at most once per window; later messages are summed into one follow-up
+PING_DELETE_AFTER = 5
 
 class PingRoles(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # guild_id -> {(message_id, emoji): role_id}; mirrors the ping_roles table
+        self.reaction_roles = LazyCache(self.load_reaction_roles)
+        # Message IDs with at least one reaction role, so other reactions are dropped with one set lookup
+        self.watched_messages = set()
+        self.channel_pings = LazyCache(self.load_channel_pings)  # channel_id -> role_id; mirrors the channel_ping_roles table
+        self.pending_pings = {}  # channel_id -> messages since that channel's last ping
+        self.ping_tasks = {}  # channel_id -> task sending that channel's pings
+        bot.pipeline.register("pingroles", self.check_message, snapshot=self.snapshot_channel)
+
+    def cog_unload(self):
+        self.bot.pipeline.unregister("pingroles")
+        for task in self.ping_tasks.values():
+            task.cancel()
+
+    async def load_reaction_roles(self):
+        reaction_roles = by_guild(await self.bot.db.configs.fetchall(
+            "SELECT guild_id, message_id, reaction, role_id FROM ping_roles"
+        ))
+        self.watched_messages = {message_id for roles in reaction_roles.values() for message_id, _ in roles}
+        return reaction_roles
+
+    async def get_reaction_roles(self):
+        return await self.reaction_roles.get()
+
+    async def load_channel_pings(self):
+        return dict(await self.bot.db.configs.fetchall("SELECT channel_id, role_id FROM channel_ping_roles"))
+
+    async def get_channel_pings(self):
+        return await self.channel_pings.get()
 
-    async def create_table_if_not_exists(self, guild_id):
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute(
-                f"""CREATE TABLE IF NOT EXISTS ping_roles_{guild_id} (
-                    message_id INTEGER, 
-                    reaction TEXT, 
-                    role_id INTEGER
-                )"""
-            )
-            await db.execute(
-                f"""CREATE TABLE IF NOT EXISTS channel_ping_roles_{guild_id} (
-                    channel_id INTEGER PRIMARY KEY, 
-                    role_id INTEGER
-                )"""
-            )
-            await db.commit()
+    @commands.Cog.listener()
+    async def on_legacy_migrated(self, guild_ids):
+        # Reloaded on next use, with the migrated reaction roles and channel pings
+        self.reaction_roles.reset()
+        self.channel_pings.reset()
+
+    async def lookup_reaction_role(self, payload):
+        """Return the role ID for a reaction, or None without touching the database."""
+        reaction_roles = await self.get_reaction_roles()
+        if payload.message_id not in self.watched_messages:
+            return None
+        return reaction_roles.get(payload.guild_id, {}).get((payload.message_id, str(payload.emoji)))
 
     pingroles = SlashCommandGroup(name="pingroles", description="Manage ping roles")
 
@@ -36,14 +65,13 @@ class PingRoles(commands.Cog):
         except ValueError:
             return await ctx.respond("The message ID must be a valid integer.", ephemeral=True)
 
-        await self.create_table_if_not_exists(ctx.guild.id)
-
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute(
-                f"INSERT INTO ping_roles_{ctx.guild.id} (message_id, reaction, role_id) VALUES (?, ?, ?)",
-                (message_id, reaction, role.id)
-            )
-            await db.commit()
+        await self.bot.db.configs.execute(
+            "INSERT OR REPLACE INTO ping_roles (guild_id, message_id, reaction, role_id) VALUES (?, ?, ?, ?)",
+            (ctx.guild.id, message_id, reaction, role.id)
+        )
+        reaction_roles = await self.get_reaction_roles()
+        reaction_roles.setdefault(ctx.guild.id, {})[(message_id, reaction)] = role.id
+        self.watched_messages.add(message_id)
 
         try:
             message = await ctx.channel.fetch_message(message_id)
@@ -65,14 +93,14 @@ class PingRoles(commands.Cog):
         except ValueError:
             return await ctx.respond("The message ID must be a valid integer.", ephemeral=True)
 
-        await self.create_table_if_not_exists(ctx.guild.id)
-
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute(
-                f"DELETE FROM ping_roles_{ctx.guild.id} WHERE message_id = ? AND reaction = ?",
-                (message_id, reaction)
-            )
-            await db.commit()
+        await self.bot.db.configs.execute(
+            "DELETE FROM ping_roles WHERE guild_id = ? AND message_id = ? AND reaction = ?",
+            (ctx.guild.id, message_id, reaction)
+        )
+        guild_roles = (await self.get_reaction_roles()).get(ctx.guild.id, {})
+        guild_roles.pop((message_id, reaction), None)
+        if not any(watched_id == message_id for watched_id, _ in guild_roles):
+            self.watched_messages.discard(message_id)
 
         try:
             message = await ctx.channel.fetch_message(message_id)
@@ -89,14 +117,11 @@ class PingRoles(commands.Cog):
         if not ctx.author.guild_permissions.administrator:
             return await ctx.respond("You need admin permissions to use this command.", ephemeral=True)
 
-        await self.create_table_if_not_exists(ctx.guild.id)
-
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute(
-                f"INSERT OR REPLACE INTO channel_ping_roles_{ctx.guild.id} (channel_id, role_id) VALUES (?, ?)",
-                (channel.id, role.id)
-            )
-            await db.commit()
+        await self.bot.db.configs.execute(
+            "INSERT OR REPLACE INTO channel_ping_roles (guild_id, channel_id, role_id) VALUES (?, ?, ?)",
+            (ctx.guild.id, channel.id, role.id)
+        )
+        (await self.get_channel_pings())[channel.id] = role.id
 
         await ctx.respond(f"Messages in {channel.mention} will now ping {role.name}.", ephemeral=True)
 
@@ -105,78 +130,87 @@ class PingRoles(commands.Cog):
         if not ctx.author.guild_permissions.administrator:
             return await ctx.respond("You need admin permissions to use this command.", ephemeral=True)
 
-        await self.create_table_if_not_exists(ctx.guild.id)
-
-        async with aiosqlite.connect("./db/configs.db") as db:
-            await db.execute(
-                f"DELETE FROM channel_ping_roles_{ctx.guild.id} WHERE channel_id = ?",
-                (channel.id,)
-            )
-            await db.commit()
+        await self.bot.db.configs.execute(
+            "DELETE FROM channel_ping_roles WHERE guild_id = ? AND channel_id = ?",
+            (ctx.guild.id, channel.id)
+        )
+        (await self.get_channel_pings()).pop(channel.id, None)
 
         await ctx.respond(f"Ping role removed from {channel.mention}.", ephemeral=True)
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
-        if payload.member.bot:
+        if payload.member is None or payload.member.bot:
             return
 
-        await self.create_table_if_not_exists(payload.guild_id)
-
-        async with aiosqlite.connect("./db/configs.db") as db:
-            async with db.execute(
-                f"SELECT role_id FROM ping_roles_{payload.guild_id} WHERE message_id = ? AND reaction = ?",
-                (payload.message_id, str(payload.emoji))
-            ) as cursor:
-                role_data = await cursor.fetchone()
-                if role_data:
-                    guild = self.bot.get_guild(payload.guild_id)
-                    if guild:
-                        role = guild.get_role(role_data[0])
-                        member = guild.get_member(payload.user_id)
-                        if role and member:
-                            await member.add_roles(role)
+        role_id = await self.lookup_reaction_role(payload)
+        if role_id:
+            guild = self.bot.get_guild(payload.guild_id)
+            if guild:
+                role = guild.get_role(role_id)
+                if role:
+                    # payload.member comes with the event, so its roles are current
+                    self.bot.roles.add(payload.member, role)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload):
+        role_id = await self.lookup_reaction_role(payload)
+        if not role_id:
+            return
+
         guild = self.bot.get_guild(payload.guild_id)
         if not guild:
             return
 
+        # Remove events carry no member; the queue only needs its ID and guild, not its cached roles
         member = guild.get_member(payload.user_id)
-        if not member or member.bot:
+        if member is None:
+            try:
+                member = await guild.fetch_member(payload.user_id)
+            except discord.HTTPException:
+                return
+        if member.bot:
             return
 
-        await self.create_table_if_not_exists(payload.guild_id)
-
-        async with aiosqlite.connect("./db/configs.db") as db:
-            async with db.execute(
-                f"SELECT role_id FROM ping_roles_{payload.guild_id} WHERE message_id = ? AND reaction = ?",
-                (payload.message_id, str(payload.emoji))
-            ) as cursor:
-                role_data = await cursor.fetchone()
-                if role_data:
-                    role = guild.get_role(role_data[0])
-                    if role:
-                        await member.remove_roles(role)
-
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return
-
-        await self.create_table_if_not_exists(message.guild.id)
-
-        async with aiosqlite.connect("./db/configs.db") as db:
-            async with db.execute(
-                f"SELECT role_id FROM channel_ping_roles_{message.guild.id} WHERE channel_id = ?",
-                (message.channel.id,)
-            ) as cursor:
-                role_data = await cursor.fetchone()
-                if role_data:
-                    role = message.guild.get_role(role_data[0])
-                    if role:
-                        await message.channel.send(f"{role.mention} You have been pinged!", delete_after=5)
+        role = guild.get_role(role_id)
+        if role:
+            self.bot.roles.remove(member, role)
+
+    async def snapshot_channel(self, context):
+        return (await self.get_channel_pings()).get(context.channel.id)
+
+    async def check_message(self, context):
+        role_id = context.config["pingroles"]
+        if role_id:
+            channel_id = context.channel.id
+            if channel_id in self.pending_pings:
+                # Already pinged this window; counted into the next summary instead
+                self.pending_pings[channel_id] += 1
+                return
+            role = context.guild.get_role(role_id)
+            if role:
+                self.pending_pings[channel_id] = 0
+                self.ping_tasks[channel_id] = asyncio.ensure_future(self.ping_channel(context.channel, role))
+
+    async def ping_channel(self, channel, role):
+        """Ping role now, then once per PING_WINDOW while messages keep arriving."""
+        try:
+            await channel.send(f"{role.mention} You have been pinged!", delete_after=PING_DELETE_AFTER)
+            while True:
+                await asyncio.sleep(PING_WINDOW)
+                count = self.pending_pings[channel.id]
+                if not count:
+                    break
+                self.pending_pings[channel.id] = 0
+                await channel.send(
+                    f"{role.mention} You have been pinged! ({count} more messages)",
+                    delete_after=PING_DELETE_AFTER
+                )
+        except discord.HTTPException as e:
+            print(f"Failed to ping {role.id} in channel {channel.id}: {e}")
+        finally:
+            del self.pending_pings[channel.id]
+            del self.ping_tasks[channel.id]
 
 def setup(bot):
     bot.add_cog(PingRoles(bot))
@@ -1,65 +1,52 @@
 import discord
 from discord.ext import commands
-import aiosqlite
-import datetime
-import random
+from utils.templates import WelcomeContext, WelcomeTemplate
+
+BATCH_MENTIONS = 50  # Members mentioned by name in a combined welcome message
 
 class Welcome(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.invites = {}  # Store invites to track who invited new members
-        bot.loop.create_task(self.initialize_db())
-        bot.loop.create_task(self.cache_invites())
-
-    async def initialize_db(self):
-        try:
-            async with aiosqlite.connect("db/configs.db") as db:
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS welcome_config (
-                        guild_id INTEGER PRIMARY KEY,
-                        channel_id INTEGER,
-                        message TEXT,
-                        color TEXT,
-                        title TEXT
-                    )
-                """)
-                await db.commit()
-        except Exception as e:
-            print(f"Failed to initialize the database: {e}")
+        self.templates = {}  # guild_id -> compiled WelcomeTemplate
+        bot.joins.register("welcome", self.welcome_batch)
 
-    async def cache_invites(self):
-        """Cache all invites when the bot starts."""
-        await self.bot.wait_until_ready()
-        for guild in self.bot.guilds:
-            self.invites[guild.id] = await guild.invites()
+    def cog_unload(self):
+        self.bot.joins.unregister("welcome")
 
     async def get_welcome_config(self, guild_id):
-        async with aiosqlite.connect("db/configs.db") as db:
-            async with db.execute("""
-                SELECT channel_id, message, color, title FROM welcome_config WHERE guild_id = ?
-            """, (guild_id,)) as cursor:
-                return await cursor.fetchone()
+        return await self.bot.db.configs.fetchone("""
+            SELECT channel_id, message, color, title, batch_threshold FROM welcome_config WHERE guild_id = ?
+        """, (guild_id,))
 
     async def set_welcome_config(self, guild_id, channel_id=None, message=None, color=None, title=None):
-        async with aiosqlite.connect("db/configs.db") as db:
-            await db.execute("""
-                INSERT OR REPLACE INTO welcome_config (guild_id, channel_id, message, color, title)
-                VALUES (
-                    ?, 
-                    COALESCE(?, (SELECT channel_id FROM welcome_config WHERE guild_id = ?)), 
-                    COALESCE(?, (SELECT message FROM welcome_config WHERE guild_id = ?)), 
-                    COALESCE(?, (SELECT color FROM welcome_config WHERE guild_id = ?)), 
-                    COALESCE(?, (SELECT title FROM welcome_config WHERE guild_id = ?))
-                )
-            """, (guild_id, channel_id, guild_id, message, guild_id, color, guild_id, title, guild_id))
-            await db.commit()
+        await self.bot.db.configs.execute("""
+            INSERT INTO welcome_config (guild_id, channel_id, message, color, title)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (guild_id) DO UPDATE SET
+                channel_id = COALESCE(excluded.channel_id, channel_id),
+                message = COALESCE(excluded.message, message),
+                color = COALESCE(excluded.color, color),
+                title = COALESCE(excluded.title, title)
+        """, (guild_id, channel_id, message, color, title))
+
+    async def set_batch_threshold(self, guild_id, threshold):
+        await self.bot.db.configs.execute("""
+            INSERT INTO welcome_config (guild_id, batch_threshold) VALUES (?, ?)
+            ON CONFLICT (guild_id) DO UPDATE SET batch_threshold = excluded.batch_threshold
+        """, (guild_id, threshold))
 
     async def delete_welcome_config(self, guild_id):
-        async with aiosqlite.connect("db/configs.db") as db:
-            await db.execute("""
-                DELETE FROM welcome_config WHERE guild_id = ?
-            """, (guild_id,))
-            await db.commit()
+        await self.bot.db.configs.execute("""
+            DELETE FROM welcome_config WHERE guild_id = ?
+        """, (guild_id,))
+        self.templates.pop(guild_id, None)
+
+    def get_template(self, guild_id, message):
+        """Return the guild's compiled template, recompiling only when the message text changed."""
+        template = self.templates.get(guild_id)
+        if template is None or template.text != message:
+            template = self.templates[guild_id] = WelcomeTemplate(message)
+        return template
 
     def create_embed(self, title, description, color):
         return discord.Embed(
@@ -107,6 +94,8 @@ class Welcome(commands.Cog):
             return
 
         await self.set_welcome_config(ctx.guild.id, message=message, color=color, title=title)
+        if message:
+            self.get_template(ctx.guild.id, message)
         
         embed = self.create_embed(
             title="Welcome Message Customized",
@@ -119,6 +108,17 @@ class Welcome(commands.Cog):
         )
         await ctx.respond(embed=embed)
 
+    @welcome.command(name="batch", description="Set how many simultaneous joins get one combined welcome message")
+    @commands.has_permissions(administrator=True)
+    async def welcome_batch_threshold(self, ctx, threshold: discord.Option(int, "Joins in one burst that share a welcome message", min_value=2)):
+        await self.set_batch_threshold(ctx.guild.id, threshold)
+        embed = self.create_embed(
+            title="Welcome Batching Set",
+            description=f"Bursts of {threshold} or more joins will get one combined welcome message.",
+            color="#0000FF"
+        )
+        await ctx.respond(embed=embed)
+
     @welcome.command(name="clear", description="Clear the welcome message, color, or title")
     @commands.has_permissions(administrator=True)
     async def welcome_clear(self, ctx, field: str):
@@ -181,89 +181,74 @@ class Welcome(commands.Cog):
         )
         await ctx.respond(embed=embed)
 
-    @commands.Cog.listener()
-    async def on_member_join(self, member):
-        config = await self.get_welcome_config(member.guild.id)
+    async def welcome_batch(self, batch):
+        config = await self.get_welcome_config(batch.guild.id)
         if config:
-            channel_id, welcome_message, color, title = config
-            channel = member.guild.get_channel(channel_id)
+            channel_id, welcome_message, color, title, batch_threshold = config
+            channel = batch.guild.get_channel(channel_id)
             if channel:
-                # Track the inviter by comparing invite counts
-                invites_before = self.invites.get(member.guild.id, [])
-                invites_after = await member.guild.invites()
-                
-                invite_used = None
-                inviter = None
-                
-                for invite in invites_before:
-                    for new_invite in invites_after:
-                        if invite.code == new_invite.code and invite.uses < new_invite.uses:
-                            invite_used = new_invite
-                            inviter = invite.inviter
-                            break
-                    if invite_used:
-                        break
-
-                self.invites[member.guild.id] = invites_after  # Update cached invites
-
-                # Format the welcome message
-                inviter_info = {
-                    "inviter": inviter.display_name if inviter else "Unknown",
-                    "inviter_name": inviter.name if inviter else "Unknown",
-                    "inviter_discriminator": inviter.discriminator if inviter else "0000",
-                    "inviter_mention": inviter.mention if inviter else "Unknown",
-                    "inviter_id": inviter.id if inviter else "Unknown",
-                    "inviter_avatar": inviter.avatar.url if inviter and inviter.avatar else "https://i.postimg.cc/fLQJvHRb/blank-profile-picture.png",
-                    "inviter_invites": "N/A",  # You need to implement logic to get inviter's invites
-                    "inviter_reg_invites": "N/A",
-                    "inviter_leave_invites": "N/A",
-                    "inviter_fake_invites": "N/A",
-                    "inviter_bonus_invites": "N/A",
-                    "member": member.display_name,
-                    "member_name": member.name,
-                    "member_discriminator": member.discriminator,
-                    "member_mention": member.mention,
-                    "member_id": member.id,
-                    "member_avatar": member.avatar.url if member.avatar else "https://i.postimg.cc/fLQJvHRb/blank-profile-picture.png",
-                    "member_created": member.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                    "member_created_ago": (datetime.datetime.utcnow() - member.created_at).days,
-                    "member_joined": member.joined_at.strftime("%Y-%m-%d %H:%M:%S"),
-                    "member_joined_ago": (datetime.datetime.utcnow() - member.joined_at).days,
-                    "member_join_count": "N/A",
-                    "member_leave_count": "N/A",
-                    "inviter_bonus_invites": "N/A",
-                    "guild_name": member.guild.name,
-                    "guild_avatar": member.guild.icon.url if member.guild.icon else "https://i.postimg.cc/fLQJvHRb/blank-profile-picture.png",
-                    "guild_count": member.guild.member_count,
-                    "invite_code": invite_used.code if invite_used else "N/A",
-                    "invite_uses": invite_used.uses if invite_used else "N/A",
-                    "invite_url": f"https://discord.gg/{invite_used.code}" if invite_used else "N/A",
-                    "random_color": "#{:06x}".format(random.randint(0, 0xFFFFFF))
-                }
-
-                # Replace variables in welcome message
-                if welcome_message:
-                    for key, value in inviter_info.items():
-                        welcome_message = welcome_message.replace(f"%{key}%", str(value))
-
-                    embed = self.create_embed(
-                        title=title or "Welcome!",
-                        description=welcome_message,
-                        color=color or "#00FF00"
-                    )
-                    await channel.send(embed=embed)
+                if len(batch) >= batch_threshold:
+                    await self.send_batch_welcome(channel, batch, color, title)
+                else:
+                    for member in batch.members:
+                        await self.send_welcome(member, channel, welcome_message, color, title)
+
+    async def send_batch_welcome(self, channel, batch, color, title):
+        """Greet a burst of joins with one message instead of one per member."""
+        mentions = " ".join(member.mention for member in batch.members[:BATCH_MENTIONS])
+        if len(batch) > BATCH_MENTIONS:
+            mentions += f" and {len(batch) - BATCH_MENTIONS} more"
+        embed = self.create_embed(
+            title=title or "Welcome!",
+            description=f"Welcome to **{batch.guild.name}**, {len(batch)} new members!\n{mentions}",
+            color=color or "#00FF00"
+        )
+        await channel.send(embed=embed)
 
-    @commands.Cog.listener()
-    async def on_member_remove(self, member):
-        pass  # Add handling if needed
+    async def send_welcome(self, member, channel, welcome_message, color, title):
+        if not welcome_message:
+            return
+        template = self.get_template(member.guild.id, welcome_message)
+        # The tracker settles a whole burst of joins with one invite fetch
+        invite_used = await self.bot.invites.invite_used(member) if template.uses_invite else None
+        context = WelcomeContext(member, invite_used)
+        # Counts were already updated by the counters join handler; these are key lookups
+        if template.uses_member_counts:
+            context.member_counts = await self.bot.counters.member_counts(member.guild.id, member.id)
+        if template.uses_invite_counts and context.inviter:
+            context.invite_counts = await self.bot.counters.invite_counts(member.guild.id, context.inviter.id)
+        embed = self.create_embed(
+            title=title or "Welcome!",
+            description=template.render(context),
+            color=color or "#00FF00"
+        )
+        await channel.send(embed=embed)
 
-    @commands.Cog.listener()
-    async def on_invite_create(self, invite):
-        self.invites[invite.guild.id] = await invite.guild.invites()
+    @discord.slash_command(name="invites", description="Show how many members someone has invited.")
+    async def invites(self, ctx, member: discord.Option(discord.Member, "Member to check", required=False)):
+        member = member or ctx.author
+        counts = await self.bot.counters.invite_counts(ctx.guild.id, member.id)
+        embed = self.create_embed(
+            title=f"Invites for {member.display_name}",
+            description=(
+                f"**{counts.total}** invites\n"
+                f"{counts.regular} regular, {counts.leaves} left, {counts.fake} fake, {counts.bonus} bonus"
+            ),
+            color="#0000FF"
+        )
+        await ctx.respond(embed=embed)
 
-    @commands.Cog.listener()
-    async def on_invite_delete(self, invite):
-        self.invites[invite.guild.id] = await invite.guild.invites()
+    @discord.slash_command(name="bonus_invites", description="Add or remove bonus invites for a member.")
+    @commands.has_permissions(administrator=True)
+    async def bonus_invites(self, ctx, member: discord.Member, amount: discord.Option(int, "Bonus invites to add (negative to remove)")):
+        await self.bot.counters.add_bonus(ctx.guild.id, member.id, amount)
+        counts = await self.bot.counters.invite_counts(ctx.guild.id, member.id)
+        embed = self.create_embed(
+            title="Bonus Invites Updated",
+            description=f"{member.mention} now has {counts.bonus} bonus invites and {counts.total} invites in total.",
+            color="#00FF00"
+        )
+        await ctx.respond(embed=embed)
 
 def setup(bot):
     bot.add_cog(Welcome(bot))
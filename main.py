@@ -3,10 +3,18 @@ from discord.ext import tasks, commands
 from dotenv import load_dotenv
 import os
 from colorama import Fore, Style
-import aiosqlite
 import time
 import logging
 import traceback
+from utils.database import DatabaseManager
+from utils.leaderboard import LeaderboardManager
+from utils.usernames import UsernameResolver
+from utils.invites import InviteTracker
+from utils.joins import JoinBurstProcessor
+from utils.counters import JoinCounters
+from utils.roles import RoleMutationQueue
+from utils.pipeline import MessagePipeline
+from utils.schema import apply_migrations
 
 # Ensure required directories exist
 if not os.path.exists("db/"):
@@ -20,25 +28,45 @@ TOKEN = os.getenv("BOT_TOKEN")
 GUILD_ID = int(os.getenv("GUILD_ID"))
 CHANNEL_ID = int(os.getenv("CHANNEL_ID"))
 
+class MkBot(discord.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.db = DatabaseManager()  # Shared connections, used by every cog
+        self.leaderboards = LeaderboardManager(self.db)
+        self.usernames = UsernameResolver(self, self.db.configs)
+        self.pipeline = MessagePipeline()  # Runs the cogs' message stages in a fixed order
+        self.invites = InviteTracker(self)  # Which invite each new member used
+        for event in ("on_ready", "on_guild_join", "on_guild_remove", "on_member_join", "on_invite_create", "on_invite_delete"):
+            self.add_listener(getattr(self.invites, event), event)
+        self.joins = JoinBurstProcessor()  # Hands the cogs' join handlers one batch of members at a time
+        self.add_listener(self.joins.on_member_join, "on_member_join")
+        self.add_listener(self.joins.on_member_remove, "on_member_remove")
+        self.roles = RoleMutationQueue()  # Merges role changes into one edit per member
+        self.counters = JoinCounters(self, self.db.configs)  # Join, leave and invite counts
+        self.joins.register("counters", self.counters.record_joins, on_leave=self.counters.record_leaves)
+
+    async def start(self, *args, **kwargs):
+        await self.db.start()
+        await apply_migrations(self.db)
+        print(f"{Fore.BLUE}INFO:{Style.RESET_ALL} All Databases are loaded successfully.")
+        await super().start(*args, **kwargs)
+
+    async def close(self):
+        await super().close()
+        # Let cogs write out anything they buffer in memory before the databases close
+        for cog in list(self.cogs.values()):
+            if hasattr(cog, "cog_shutdown"):
+                await cog.cog_shutdown()
+        await self.usernames.close()
+        await self.db.close()
+
 # Initialize bot with intents
 intents = discord.Intents.default()
 intents.guilds = True
-bot = discord.Bot(intents=intents)
+bot = MkBot(intents=intents)
 
 start_time = time.time()
 
-async def initialize_database(db_path):
-    if not os.path.exists(os.path.dirname(db_path)):
-        os.makedirs(os.path.dirname(db_path))
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute("CREATE TABLE IF NOT EXISTS db_init (init INTEGER)")
-        await db.commit()
-
-async def setup_databases():
-    await initialize_database("./db/economy.db")
-    await initialize_database("./db/configs.db")
-    await initialize_database("./db/giveaways.db")
-
 def get_uptime():
     current_time = time.time()
     uptime_seconds = current_time - start_time
@@ -50,8 +78,6 @@ def get_uptime():
 @bot.event
 async def on_ready():
     print(f"{Fore.BLUE}INFO:{Style.RESET_ALL} Bot is running!")
-    await setup_databases()
-    print(f"{Fore.BLUE}INFO:{Style.RESET_ALL} All Databases are loaded successfully.")
     for filename in os.listdir("./cogs"):
         if filename.endswith(".py"):
             print(f"{Fore.BLUE}INFO: {Style.RESET_ALL}Loaded cog: {filename}")
@@ -60,6 +86,10 @@ for filename in os.listdir("./cogs"):
     if filename.endswith(".py"):
         bot.load_extension(f"cogs.{filename[:-3]}")
 
+@bot.event
+async def on_message(message):
+    await bot.pipeline.process(message)
+
 @bot.event
 async def on_interaction(interaction):
     if interaction.guild_id is None:
@@ -75,6 +105,11 @@ async def status(ctx):
     embed.add_field(name="Bot ID", value=bot.user.id, inline=True)
     embed.add_field(name="Servers Count", value=guild_count, inline=True)  # Add server count field
     embed.add_field(name="Uptime", value=uptime, inline=False)
+    stage_latency = "\n".join(
+        f"`{name}`: {average:.1f} ms avg, {worst:.1f} ms max ({calls} messages)"
+        for name, calls, average, worst in bot.pipeline.latency_report()
+    )
+    embed.add_field(name="Message Pipeline", value=stage_latency or "No stages registered", inline=False)
     embed.set_thumbnail(url=bot.user.avatar.url)  # The avatar is displayed round by default in Discord
     await ctx.respond(embed=embed)
 
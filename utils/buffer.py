@@ -0,0 +1,40 @@
+import asyncio
+
+
+class WriteBehindBuffer:
+    """Base for rows kept in memory and written to the database in batches.
+
+    Subclasses keep their rows in self.pending and implement write(), which
+    flush() runs under flush_lock whenever something is pending. Once
+    max_pending rows are queued, flush_if_full() starts one background
+    flush, kept as _flush_task so no second one starts while it runs, and
+    prints its error instead of leaving it unretrieved.
+    """
+
+    name = "buffer"  # What the buffer holds, for error messages
+
+    def __init__(self, db, max_pending):
+        self.db = db
+        self.max_pending = max_pending
+        self.pending = {}  # Replaced by subclasses with whatever collection suits their rows
+        self.flush_lock = asyncio.Lock()
+        self._flush_task = None
+
+    def flush_if_full(self):
+        if len(self.pending) >= self.max_pending and self._flush_task is None and not self.flush_lock.locked():
+            self._flush_task = asyncio.ensure_future(self.flush())
+            self._flush_task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task):
+        self._flush_task = None
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Failed to save {self.name}: {task.exception()}")
+
+    async def flush(self):
+        async with self.flush_lock:
+            if self.pending:
+                await self.write()
+
+    async def write(self):
+        """Write out self.pending; on failure, keep the rows pending for the next flush and raise."""
+        raise NotImplementedError
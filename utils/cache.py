@@ -0,0 +1,32 @@
+import asyncio
+
+
+class LazyCache:
+    """A value loaded on first use and kept in memory, such as a table mirrored as a dict.
+
+    Concurrent first uses share one load. reset() drops the value so the
+    next get() loads it again.
+    """
+
+    def __init__(self, load):
+        self.load = load  # async () -> value
+        self.value = None
+        self.lock = asyncio.Lock()
+
+    async def get(self):
+        if self.value is None:
+            async with self.lock:
+                if self.value is None:
+                    self.value = await self.load()
+        return self.value
+
+    def reset(self):
+        self.value = None
+
+
+def by_guild(rows):
+    """Group (guild_id, *key, value) rows into {guild_id: {key: value}}; keys of several columns become tuples."""
+    grouped = {}
+    for guild_id, *key, value in rows:
+        grouped.setdefault(guild_id, {})[key[0] if len(key) == 1 else tuple(key)] = value
+    return grouped
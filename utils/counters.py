@@ -0,0 +1,107 @@
+import datetime
+import discord
+
+FAKE_ACCOUNT_AGE = datetime.timedelta(days=7)  # Joins from younger accounts count as fake invites
+
+
+class InviteCounts:
+    __slots__ = ("regular", "leaves", "fake", "bonus")
+
+    def __init__(self, regular=0, leaves=0, fake=0, bonus=0):
+        self.regular = regular
+        self.leaves = leaves
+        self.fake = fake
+        self.bonus = bonus
+
+    @property
+    def total(self):
+        return self.regular - self.leaves + self.bonus
+
+
+class JoinCounters:
+    """Join/leave counts per member and invite counts per inviter, shared through bot.counters.
+
+    Every join and leave is one upsert on each table, so reading a count is
+    a primary key lookup and nothing is ever recounted from history. A join
+    counts as fake when the account is younger than FAKE_ACCOUNT_AGE; fake
+    joins that leave again are not counted as leaves.
+    """
+
+    def __init__(self, bot, db):
+        self.bot = bot
+        self.db = db
+
+    async def record_joins(self, batch):
+        """Join handler: count every member in the batch and credit the invites they used."""
+        now = discord.utils.utcnow()
+        members, inviters = [], []
+        for member in batch.members:
+            invite = await self.bot.invites.invite_used(member)
+            inviter_id = invite.inviter.id if invite and invite.inviter else None
+            fake = int(now - member.created_at < FAKE_ACCOUNT_AGE)
+            members.append((batch.guild.id, member.id, inviter_id, fake))
+            if inviter_id is not None:
+                inviters.append((batch.guild.id, inviter_id, 1 - fake, fake))
+        async with self.db.transaction() as conn:
+            await conn.executemany(
+                """
+                INSERT INTO member_counters (guild_id, user_id, joins, inviter_id, fake) VALUES (?, ?, 1, ?, ?)
+                ON CONFLICT (guild_id, user_id) DO UPDATE SET
+                    joins = joins + 1, inviter_id = excluded.inviter_id, fake = excluded.fake
+                """,
+                members
+            )
+            await conn.executemany(
+                """
+                INSERT INTO invite_counters (guild_id, inviter_id, regular, fake) VALUES (?, ?, ?, ?)
+                ON CONFLICT (guild_id, inviter_id) DO UPDATE SET
+                    regular = regular + excluded.regular, fake = fake + excluded.fake
+                """,
+                inviters
+            )
+
+    async def record_leaves(self, batch):
+        """Leave handler: count every member who left, after any join of theirs in the same batch."""
+        async with self.db.transaction() as conn:
+            for member in batch.leaves:
+                async with conn.execute(
+                    """
+                    INSERT INTO member_counters (guild_id, user_id, leaves) VALUES (?, ?, 1)
+                    ON CONFLICT (guild_id, user_id) DO UPDATE SET leaves = leaves + 1
+                    RETURNING inviter_id, fake
+                    """,
+                    (batch.guild.id, member.id)
+                ) as cursor:
+                    inviter_id, fake = await cursor.fetchone()
+                if inviter_id is not None and not fake:
+                    await conn.execute(
+                        """
+                        INSERT INTO invite_counters (guild_id, inviter_id, leaves) VALUES (?, ?, 1)
+                        ON CONFLICT (guild_id, inviter_id) DO UPDATE SET leaves = leaves + 1
+                        """,
+                        (batch.guild.id, inviter_id)
+                    )
+
+    async def member_counts(self, guild_id, user_id):
+        """Return (joins, leaves) for a member."""
+        row = await self.db.fetchone(
+            "SELECT joins, leaves FROM member_counters WHERE guild_id = ? AND user_id = ?",
+            (guild_id, user_id)
+        )
+        return row or (0, 0)
+
+    async def invite_counts(self, guild_id, inviter_id):
+        row = await self.db.fetchone(
+            "SELECT regular, leaves, fake, bonus FROM invite_counters WHERE guild_id = ? AND inviter_id = ?",
+            (guild_id, inviter_id)
+        )
+        return InviteCounts(*row) if row else InviteCounts()
+
+    async def add_bonus(self, guild_id, inviter_id, amount):
+        await self.db.execute(
+            """
+            INSERT INTO invite_counters (guild_id, inviter_id, bonus) VALUES (?, ?, ?)
+            ON CONFLICT (guild_id, inviter_id) DO UPDATE SET bonus = bonus + excluded.bonus
+            """,
+            (guild_id, inviter_id, amount)
+        )
@@ -0,0 +1,127 @@
+import asyncio
+import contextlib
+import os
+import aiosqlite
+
+DATABASE_FILES = {
+    "economy": "./db/economy.db",
+    "configs": "./db/configs.db",
+    "giveaways": "./db/giveaways.db",
+    "levelsys": "./db/levelsys.db",
+    "automod": "./db/automod.db",
+}
+
+# Applied once per connection, not per query
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Size of sqlite3's per-connection prepared statement cache
+STATEMENT_CACHE_SIZE = 256
+
+
+class Database:
+    """A single long-lived connection to one SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self.attached = set()
+
+    async def connect(self):
+        async with self._connect_lock:
+            if self.conn is not None:
+                return self.conn
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            conn = await aiosqlite.connect(self.path, cached_statements=STATEMENT_CACHE_SIZE)
+            for pragma in PRAGMAS:
+                await conn.execute(pragma)
+            self.conn = conn
+            return conn
+
+    async def close(self):
+        async with self._connect_lock:
+            if self.conn is not None:
+                await self.conn.close()
+                self.conn = None
+                self.attached.clear()
+
+    async def attach(self, alias, path):
+        """Make another database file readable from this connection as alias.table."""
+        conn = self.conn or await self.connect()
+        async with self._write_lock:
+            if alias not in self.attached:
+                await conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+                self.attached.add(alias)
+
+    async def fetchone(self, sql, params=()):
+        conn = self.conn or await self.connect()
+        async with conn.execute(sql, params) as cursor:
+            return await cursor.fetchone()
+
+    async def fetchall(self, sql, params=()):
+        conn = self.conn or await self.connect()
+        async with conn.execute(sql, params) as cursor:
+            return await cursor.fetchall()
+
+    async def execute(self, sql, params=()):
+        """Run a single write statement and commit it."""
+        conn = self.conn or await self.connect()
+        async with self._write_lock:
+            cursor = await conn.execute(sql, params)
+            await conn.commit()
+            return cursor
+
+    async def executemany(self, sql, seq_of_params):
+        """Run one write statement for every parameter set in a single commit."""
+        conn = self.conn or await self.connect()
+        async with self._write_lock:
+            cursor = await conn.executemany(sql, seq_of_params)
+            await conn.commit()
+            return cursor
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """Group several writes into one commit, rolling back on error."""
+        conn = self.conn or await self.connect()
+        async with self._write_lock:
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
+            else:
+                await conn.commit()
+
+
+class DatabaseManager:
+    """Owns one Database per file, shared by every cog through bot.db."""
+
+    def __init__(self, files=None):
+        self.databases = {name: Database(path) for name, path in (files or DATABASE_FILES).items()}
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["databases"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    async def start(self):
+        for database in self.databases.values():
+            await database.connect()
+
+    async def attach(self, target, *names):
+        """Attach the named databases to target's connection for cross-file joins."""
+        for name in names:
+            await self.databases[target].attach(name, self.databases[name].path)
+
+    async def close(self):
+        for database in self.databases.values():
+            await database.close()
@@ -0,0 +1,157 @@
+import asyncio
+import time
+import discord
+
+MAX_CONCURRENT_FETCHES = 4
+FETCH_INTERVAL = 1.0  # Seconds between invite fetches for one guild while joins keep arriving
+FORBIDDEN_RETRY = 600  # Guilds that refused the invite list are retried after ten minutes
+JOIN_TTL = 60  # Seconds a join's result stays available to every listener asking for it
+
+
+class GuildInvites:
+    __slots__ = ("codes", "ready", "waiting", "task", "forbidden_until")
+
+    def __init__(self):
+        self.codes = {}  # invite code -> discord.Invite
+        self.ready = False
+        self.waiting = []  # futures of joins to attribute with the next fetch
+        self.task = None
+        self.forbidden_until = 0
+
+
+class InviteTracker:
+    """Works out which invite each new member used, shared through bot.invites.
+
+    Every guild's invites are kept as a dict of code -> Invite. Invite
+    creation and deletion update that dict straight from the gateway events;
+    only joins need a fetch, and joins arriving while a fetch is running are
+    all attributed by the next one, so a raid costs about one request per
+    FETCH_INTERVAL instead of one per member. Every guild is warmed in the
+    background once the bot is ready, with at most MAX_CONCURRENT_FETCHES
+    fetches in flight; a join in a guild not warmed yet waits for its fetch.
+    """
+
+    def __init__(self, bot, concurrency=MAX_CONCURRENT_FETCHES):
+        self.bot = bot
+        self.guilds = {}  # guild_id -> GuildInvites
+        self.joins = {}  # (guild_id, member_id) -> future of the invite used
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    def _state(self, guild_id):
+        state = self.guilds.get(guild_id)
+        if state is None:
+            state = self.guilds[guild_id] = GuildInvites()
+        return state
+
+    def _start(self, guild, state):
+        if state.task is None or state.task.done():
+            state.task = asyncio.ensure_future(self._drain(guild, state))
+
+    def warm(self, guild):
+        state = self._state(guild.id)
+        if not state.ready:
+            self._start(guild, state)
+
+    async def snapshot(self, guild):
+        """Return the guild's cached {code: Invite}, fetching it first if it was never loaded."""
+        state = self._state(guild.id)
+        if not state.ready:
+            self._start(guild, state)
+            await asyncio.shield(state.task)
+        return state.codes
+
+    async def invite_used(self, member):
+        """Return the invite member joined with, or None if it cannot be told.
+
+        Safe to call from several on_member_join listeners: they all share the
+        result of one lookup.
+        """
+        key = (member.guild.id, member.id)
+        future = self.joins.get(key)
+        if future is None:
+            future = self.joins[key] = asyncio.get_running_loop().create_future()
+            asyncio.get_running_loop().call_later(JOIN_TTL, self.joins.pop, key, None)
+            state = self._state(member.guild.id)
+            state.waiting.append(future)
+            self._start(member.guild, state)
+        return await asyncio.shield(future)
+
+    async def _fetch(self, guild, state):
+        if state.forbidden_until > time.time():
+            return None
+        async with self.semaphore:
+            try:
+                invites = await guild.invites()
+            except discord.Forbidden:
+                state.forbidden_until = time.time() + FORBIDDEN_RETRY
+                return None
+            except discord.HTTPException as e:
+                print(f"Failed to fetch invites for guild {guild.id}: {e}")
+                return None
+        return {invite.code: invite for invite in invites}
+
+    async def _drain(self, guild, state):
+        while True:
+            batch, state.waiting = state.waiting, []
+            before = state.codes if state.ready else None
+            after = await self._fetch(guild, state)
+            used = []
+            if after is not None:
+                if before is not None:
+                    used = self.diff(before, after)
+                if not state.ready:
+                    # Keep invites created while the first fetch was in flight
+                    after = {**state.codes, **after}
+                state.codes = after
+                state.ready = True
+            # Uses can't be told apart by member, so only attribute them when every
+            # join in the batch took one use of the same invite; otherwise they are unknown
+            invite = None
+            if len(used) == len(batch) and len({use.code for use in used}) == 1:
+                invite = used[0]
+            for future in batch:
+                if not future.done():
+                    future.set_result(invite)
+            if not state.waiting:
+                return
+            await asyncio.sleep(FETCH_INTERVAL)
+
+    @staticmethod
+    def diff(before, after):
+        """Return one invite per use gained between two snapshots."""
+        used = []
+        for code, invite in after.items():
+            old = before.get(code)
+            gained = (invite.uses or 0) - ((old.uses or 0) if old else 0)
+            used.extend([invite] * max(gained, 0))
+        for code, old in before.items():
+            # A limited invite disappears when its last use is taken
+            if code not in after and old.max_uses and (old.uses or 0) + 1 == old.max_uses:
+                used.append(old)
+        return used
+
+    async def on_ready(self):
+        # Fires again after reconnects; guilds already warmed are skipped
+        for guild in self.bot.guilds:
+            self.warm(guild)
+
+    async def on_guild_join(self, guild):
+        self.warm(guild)
+
+    async def on_guild_remove(self, guild):
+        self.guilds.pop(guild.id, None)
+
+    async def on_member_join(self, member):
+        await self.invite_used(member)
+
+    async def on_invite_create(self, invite):
+        self._state(invite.guild.id).codes[invite.code] = invite
+
+    async def on_invite_delete(self, invite):
+        state = self.guilds.get(invite.guild.id)
+        if state is None:
+            return
+        old = state.codes.get(invite.code)
+        # Keep an invite deleted by its last use so the next join can still be matched to it
+        if old is not None and not (old.max_uses and (old.uses or 0) + 1 == old.max_uses):
+            del state.codes[invite.code]
@@ -0,0 +1,115 @@
+import asyncio
+import collections
+import traceback
+
+JOIN_WINDOW = 1.5  # Seconds of joins collected into one batch per guild
+
+# Join handlers run on each batch in this order: every join is counted,
+# then members banned by the invite check are dropped before they are given
+# roles or welcomed.
+HANDLER_ORDER = ("counters", "mod", "autorole", "welcome")
+
+
+class JoinBatch:
+    """Members who joined one guild within the same window, and members who left meanwhile."""
+
+    def __init__(self, guild, members, leaves=()):
+        self.guild = guild
+        self.members = members
+        self.leaves = leaves
+
+    def __len__(self):
+        return len(self.members)
+
+    def drop(self, member):
+        """Leave member out of every handler after the current one."""
+        self.members = [other for other in self.members if other.id != member.id]
+
+
+async def run_paced(items, worker, concurrency=4, interval=0.25):
+    """Await worker(item) for every item with at most concurrency in flight.
+
+    Each worker slot waits interval seconds after a call before taking the
+    next item, which keeps bursts of REST calls under Discord's rate limits.
+    """
+    queue = collections.deque(items)
+
+    async def slot():
+        while queue:
+            item = queue.popleft()
+            try:
+                await worker(item)
+            except Exception:
+                print(f"Paced task failed:\n{traceback.format_exc()}")
+            await asyncio.sleep(interval)
+
+    await asyncio.gather(*(slot() for _ in range(min(concurrency, len(queue)))))
+
+
+class JoinBurstProcessor:
+    """The bot's single on_member_join handler, shared by cogs through bot.joins.
+
+    Joins are queued per guild and handed to the registered handlers as one
+    JoinBatch after JOIN_WINDOW seconds, so a raid of hundreds of members
+    costs a handful of batches rather than hundreds of independent listener
+    runs. Batches for one guild are processed one at a time; joins arriving
+    meanwhile make up the next batch.
+
+    Leaves are routed through the same queue while a guild has joins in
+    flight, so a member who joins and leaves within one window is counted
+    in that order. Otherwise they go to the leave handlers straight away.
+    """
+
+    def __init__(self, window=JOIN_WINDOW, order=HANDLER_ORDER):
+        self.window = window
+        self.order = order
+        self.handlers = {}
+        self.leave_handlers = {}
+        self.pending = {}  # guild_id -> members waiting for the next batch
+        self.pending_leaves = {}  # guild_id -> members who left while that guild had joins in flight
+        self.tasks = {}  # guild_id -> task collecting and processing that guild's batches
+
+    def register(self, name, handler, on_leave=None):
+        if name not in self.order:
+            raise ValueError(f"Unknown join handler: {name}")
+        self.handlers[name] = handler
+        if on_leave is not None:
+            self.leave_handlers[name] = on_leave
+
+    def unregister(self, name):
+        self.handlers.pop(name, None)
+        self.leave_handlers.pop(name, None)
+
+    async def on_member_join(self, member):
+        guild_id = member.guild.id
+        self.pending.setdefault(guild_id, []).append(member)
+        if guild_id not in self.tasks:
+            self.tasks[guild_id] = asyncio.ensure_future(self._process(member.guild))
+
+    async def on_member_remove(self, member):
+        guild_id = member.guild.id
+        if guild_id in self.tasks:
+            # The member's join may still be queued; handle the leave after it
+            self.pending_leaves.setdefault(guild_id, []).append(member)
+        else:
+            await self._run_handlers(JoinBatch(member.guild, [], [member]))
+
+    async def _run_handlers(self, batch):
+        for name in self.order:
+            for handlers, members in ((self.handlers, batch.members), (self.leave_handlers, batch.leaves)):
+                handler = handlers.get(name)
+                if handler is None or not members:
+                    continue
+                try:
+                    await handler(batch)
+                except Exception:
+                    print(f"Join handler {name} failed:\n{traceback.format_exc()}")
+
+    async def _process(self, guild):
+        while True:
+            await asyncio.sleep(self.window)
+            batch = JoinBatch(guild, self.pending.pop(guild.id, []), self.pending_leaves.pop(guild.id, []))
+            await self._run_handlers(batch)
+            if guild.id not in self.pending and guild.id not in self.pending_leaves:
+                del self.tasks[guild.id]
+                return
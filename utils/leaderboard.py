@@ -0,0 +1,403 @@
+import asyncio
+import heapq
+import random
+import discord
+
+PAGE_SIZE = 10
+
+
+class _Node:
+    __slots__ = ("key", "priority", "size", "left", "right")
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.size = 1
+        self.left = None
+        self.right = None
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+
+
+def _split(node, key):
+    """Split into (keys < key, keys >= key)."""
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        _update(node)
+        return node, right
+    left, right = _split(node.left, key)
+    node.left = right
+    _update(node)
+    return left, node
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+class RankTree:
+    """Order-statistic treap of (user_id, score) pairs, highest score first.
+
+    Nodes are keyed on (-score, -user_id): ties go to the higher user ID, which
+    matches the ORDER BY used for keyset pages in the database. Every node
+    tracks its subtree size, which makes inserts, removals, rank lookups and
+    fetching the n-th entry all O(log n).
+    """
+
+    def __init__(self):
+        self.root = None
+        self.scores = {}
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __contains__(self, user_id):
+        return user_id in self.scores
+
+    def _keys(self):
+        """Yield every key in order."""
+        stack, node = [], self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.key
+            node = node.right
+
+    def load(self, entries):
+        """Add (user_id, score) pairs, keeping users already in the tree.
+
+        The pairs are merged with the tree's own keys and the treap is rebuilt
+        along the right spine in one O(n) pass, rather than one O(log n)
+        insert per row. Sorting is linear when they already come highest
+        score first, as the loading queries return them.
+        """
+        fresh = []
+        for user_id, score in entries:
+            if user_id not in self.scores:
+                self.scores[user_id] = score
+                fresh.append(self._key(user_id, score))
+        fresh.sort()
+        spine = []
+        for key in heapq.merge(self._keys(), fresh):
+            node, child = _Node(key), None
+            while spine and spine[-1].priority < node.priority:
+                child = spine.pop()
+                _update(child)
+            node.left = child
+            if spine:
+                spine[-1].right = node
+            spine.append(node)
+        self.root = spine[0] if spine else None
+        while spine:
+            _update(spine.pop())
+
+    def _insert(self, key):
+        left, right = _split(self.root, key)
+        self.root = _merge(_merge(left, _Node(key)), right)
+
+    def _delete(self, key):
+        left, right = _split(self.root, key)
+        _, right = _split(right, (key[0], key[1] + 1))
+        self.root = _merge(left, right)
+
+    @staticmethod
+    def _key(user_id, score):
+        return (-score, -user_id)
+
+    def set(self, user_id, score):
+        old = self.scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._delete(self._key(user_id, old))
+        self.scores[user_id] = score
+        self._insert(self._key(user_id, score))
+
+    def remove(self, user_id):
+        old = self.scores.pop(user_id, None)
+        if old is not None:
+            self._delete(self._key(user_id, old))
+
+    def rank(self, user_id):
+        """1-based position of a user, or None if they are not on the board."""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        key = self._key(user_id, score)
+        node, below = self.root, 0
+        while node is not None:
+            if key < node.key:
+                node = node.left
+            elif key > node.key:
+                below += _size(node.left) + 1
+                node = node.right
+            else:
+                return below + _size(node.left) + 1
+        return None
+
+    def page(self, offset, limit):
+        """Return up to limit (user_id, score) pairs starting at a 0-based offset."""
+        result = []
+        stack, node, skip = [], self.root, offset
+        # Descend straight to the first wanted entry, then walk in order from there
+        while node is not None:
+            if skip < _size(node.left):
+                stack.append(node)
+                node = node.left
+            else:
+                skip -= _size(node.left)
+                if skip == 0:
+                    stack.append(node)
+                    break
+                skip -= 1
+                node = node.right
+        while stack and len(result) < limit:
+            node = stack.pop()
+            result.append((-node.key[1], -node.key[0]))
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
+        return result
+
+
+class Leaderboard:
+    """A RankTree plus cached pages that stay valid until the ranking moves."""
+
+    def __init__(self, page_size=PAGE_SIZE):
+        self.tree = RankTree()
+        self.page_size = page_size
+        self.pages = {}  # page index -> rendered discord.Embed
+        self.version = 0  # Bumped whenever cached pages are dropped, so renders started before can tell
+
+    def __len__(self):
+        return len(self.tree)
+
+    def rank(self, user_id):
+        return self.tree.rank(user_id)
+
+    def score(self, user_id):
+        return self.tree.scores.get(user_id)
+
+    def cursor(self, index):
+        """Keyset cursor (score, user_id) of the last entry before a page, or None for the first page."""
+        if index <= 0:
+            return None
+        edge = self.tree.page(index * self.page_size - 1, 1)
+        if not edge:
+            return None
+        user_id, score = edge[0]
+        return (score, user_id)
+
+    def page_count(self):
+        return max(1, -(-len(self.tree) // self.page_size))
+
+    def set(self, user_id, score):
+        if self.tree.scores.get(user_id) == score:
+            return
+        old_rank = self.tree.rank(user_id)
+        self.tree.set(user_id, score)
+        new_rank = self.tree.rank(user_id)
+        if old_rank is None:
+            # Everyone from the new position down shifted by one
+            self._invalidate(new_rank, len(self.tree))
+        else:
+            self._invalidate(min(old_rank, new_rank), max(old_rank, new_rank))
+
+    def load(self, entries):
+        """Bulk-add (user_id, score) pairs without touching users already on the board."""
+        self.tree.load(entries)
+        self.pages.clear()
+        self.version += 1
+
+    def remove(self, user_id):
+        old_rank = self.tree.rank(user_id)
+        if old_rank is not None:
+            self.tree.remove(user_id)
+            self._invalidate(old_rank, len(self.tree) + 1)
+
+    def _invalidate(self, first_rank, last_rank):
+        self.version += 1
+        first_page = (first_rank - 1) // self.page_size
+        last_page = (last_rank - 1) // self.page_size
+        for index in [index for index in self.pages if first_page <= index <= last_page]:
+            del self.pages[index]
+
+
+class LeaderboardManager:
+    """Lazily loaded leaderboards shared by every cog through bot.leaderboards.
+
+    XP boards are per guild; the coin board is global because balances are.
+    A board is registered before it is loaded so writes that land while the
+    initial query is running are kept, and the load never overwrites them.
+    """
+
+    def __init__(self, databases):
+        self.databases = databases
+        self.levels = {}  # guild_id -> Leaderboard
+        self.coins = None
+        self._loading = {}  # board key -> asyncio.Task
+
+    async def _load(self, key, board, fill):
+        task = self._loading.get(key)
+        if task is None:
+            task = self._loading[key] = asyncio.ensure_future(fill())
+        try:
+            await asyncio.shield(task)
+        except Exception:
+            # Let the next caller retry; rows already loaded are kept
+            self._loading.pop(key, None)
+            raise
+        return board
+
+    async def get_levels(self, guild_id, before_load=None):
+        """XP board for a guild. before_load runs once, ahead of the initial query."""
+        board = self.levels.get(guild_id)
+        if board is None:
+            board = self.levels[guild_id] = Leaderboard()
+
+        async def fill():
+            if before_load:
+                await before_load()
+            board.load(await self.databases.levelsys.fetchall(
+                "SELECT user_id, total_xp FROM levels WHERE guild_id = ? ORDER BY total_xp DESC, user_id DESC", (guild_id,)
+            ))
+
+        return await self._load(("levels", guild_id), board, fill)
+
+    async def get_coins(self):
+        if self.coins is None:
+            self.coins = Leaderboard()
+        board = self.coins
+
+        async def fill():
+            board.load(await self.databases.economy.fetchall("SELECT id, coins FROM users ORDER BY coins DESC, id DESC"))
+
+        return await self._load("coins", board, fill)
+
+    def reset(self):
+        """Drop every board so the next use reloads it, e.g. after a bulk change to the tables."""
+        self.levels = {}
+        self.coins = None
+        self._loading = {}
+
+    def record_xp(self, guild_id, user_id, total_xp):
+        board = self.levels.get(guild_id)
+        if board is not None:
+            board.set(user_id, total_xp)
+
+    async def sync_coins(self, *user_ids):
+        """Re-read balances after a write; a no-op until the coin board is first used."""
+        if self.coins is None:
+            return
+        placeholders = ", ".join("?" * len(user_ids))
+        rows = await self.databases.economy.fetchall(
+            f"SELECT id, coins FROM users WHERE id IN ({placeholders})", user_ids
+        )
+        for user_id, coins in rows:
+            self.coins.set(user_id, coins)
+
+    @staticmethod
+    async def _seek(db, table, where, params, score_column, id_column, after, limit):
+        """Fetch one page by keyset. after is (score, user_id) of the entry before the page."""
+        columns = f"{score_column}, {id_column}"
+        conditions = [where] if where else []
+        if after is not None:
+            conditions.append(f"({columns}) < (?, ?)")
+            params = (*params, *after)
+        rows = await db.fetchall(
+            f"SELECT {columns} FROM {table}"
+            + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+            + f" ORDER BY {score_column} DESC, {id_column} DESC LIMIT ?",
+            (*params, limit)
+        )
+        return [(user_id, score) for score, user_id in rows]
+
+    async def fetch_levels_page(self, guild_id, after=None, limit=PAGE_SIZE):
+        # Served entirely from idx_levels_rank (guild_id, total_xp, user_id)
+        return await self._seek(
+            self.databases.levelsys, "levels", "guild_id = ?", (guild_id,),
+            "total_xp", "user_id", after, limit
+        )
+
+    async def fetch_coins_page(self, after=None, limit=PAGE_SIZE):
+        # Served entirely from idx_users_coins (coins), which carries the rowid id
+        return await self._seek(
+            self.databases.economy, "users", None, (),
+            "coins", "id", after, limit
+        )
+
+
+class LeaderboardView(discord.ui.View):
+    """Previous/next buttons for a leaderboard message.
+
+    A page is fetched with a keyset cursor taken from the board's RankTree,
+    the entry ranked just above it, so any page costs one O(log n) lookup
+    and one index seek, and its ranks and cache slot always agree with the
+    board. Rendered pages are kept in the board's page cache until a rank
+    inside them changes.
+    """
+
+    def __init__(self, author, board, fetch, render, timeout=180):
+        super().__init__(timeout=timeout, disable_on_timeout=True)
+        self.author = author
+        self.board = board
+        self.fetch = fetch  # async (after=, limit=) -> [(user_id, score), ...]
+        self.render = render  # async (entries, first rank) -> discord.Embed
+        self.index = 0
+
+    async def load(self, index):
+        # The board may have shrunk since the last page was shown
+        index = max(0, min(index, self.board.page_count() - 1))
+        embed = self.board.pages.get(index)
+        if embed is None:
+            version = self.board.version
+            entries = await self.fetch(after=self.board.cursor(index), limit=self.board.page_size)
+            embed = await self.render(entries, index * self.board.page_size + 1)
+            # Only cache the page if the ranking did not move while it was fetched and rendered
+            if self.board.version == version:
+                self.board.pages[index] = embed
+        self.index = index
+        self.previous_page.disabled = index == 0
+        self.next_page.disabled = index + 1 >= self.board.page_count()
+        embed = embed.copy()
+        embed.set_footer(
+            text=f"Page {index + 1}/{self.board.page_count()} • Requested by {self.author.display_name}",
+            icon_url=self.author.avatar.url if self.author.avatar else "https://i.postimg.cc/fLQ8T6F6/NO-USER.png"
+        )
+        return embed
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.author.id:
+            await interaction.response.send_message("Only the person who opened this leaderboard can flip its pages.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="Previous", emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, button, interaction):
+        embed = await self.load(self.index - 1)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Next", emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, button, interaction):
+        embed = await self.load(self.index + 1)
+        await interaction.response.edit_message(embed=embed, view=self)
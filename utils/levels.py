@@ -0,0 +1,45 @@
+import math
+import numpy as np
+
+
+class LevelCurve:
+    """XP curve where going from level L to L + 1 costs step * L XP.
+
+    Only the total XP a member has earned is authoritative; level and the XP
+    shown inside the current level are always derived from it, so changing the
+    curve only needs a recompute, not a replay of past messages.
+    """
+
+    def __init__(self, step=100):
+        self.step = step
+
+    def total_xp_for_level(self, level):
+        """Total XP needed to reach a level, starting from level 1 with 0 XP."""
+        return self.step * level * (level - 1) // 2
+
+    def level_for_xp(self, total_xp):
+        # Largest L with step * L * (L - 1) / 2 <= total_xp
+        q = 2 * total_xp // self.step
+        return (1 + math.isqrt(1 + 4 * q)) // 2
+
+    def progress(self, total_xp):
+        """Return (xp into the current level, level) for a total."""
+        level = self.level_for_xp(total_xp)
+        return total_xp - self.total_xp_for_level(level), level
+
+    def thresholds(self, max_level):
+        """Total XP needed for levels 1..max_level as a NumPy array."""
+        levels = np.arange(1, max_level + 1, dtype=np.int64)
+        return self.step * levels * (levels - 1) // 2
+
+    def bulk_progress(self, totals):
+        """Vectorized progress() over an array of totals, returning (xp, levels) arrays."""
+        totals = np.asarray(totals, dtype=np.int64)
+        if totals.size == 0:
+            return totals.copy(), totals.copy()
+        thresholds = self.thresholds(self.level_for_xp(int(totals.max())))
+        levels = np.searchsorted(thresholds, totals, side="right")
+        return totals - thresholds[levels - 1], levels
+
+
+LEVEL_CURVE = LevelCurve(step=100)
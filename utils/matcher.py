@@ -0,0 +1,145 @@
+import collections
+import time
+import unicodedata
+import regex
+
+# Look-alike characters folded to the Latin letter they imitate (applied after NFKC)
+CONFUSABLES = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p",
+    "с": "c", "т": "t", "у": "y", "х": "x", "ѕ": "s", "і": "i", "ј": "j", "ԁ": "d",
+    "ɡ": "g", "α": "a", "β": "b", "ε": "e", "ι": "i", "κ": "k", "ν": "v", "ο": "o",
+    "ρ": "p", "τ": "t", "υ": "u", "χ": "x", "ⅼ": "l", "ı": "i",
+    # Invisible characters used to split words
+    "\u200b": None, "\u200c": None, "\u200d": None, "\u2060": None, "\ufeff": None, "\u00ad": None,
+})
+
+RULE_KINDS = ("keyword", "regex", "glob")
+
+
+def normalize(text):
+    """Fold text to the form rules are matched against: NFKC, casefolded, look-alikes replaced."""
+    return unicodedata.normalize("NFKC", text).casefold().translate(CONFUSABLES)
+
+
+def glob_to_regex(pattern):
+    """Translate a wildcard rule (* for any run of characters, ? for one) into a regex that can match anywhere."""
+    parts = []
+    for char in normalize(pattern):
+        if char == "*":
+            parts.append(".*?")
+        elif char == "?":
+            parts.append(".")
+        else:
+            parts.append(regex.escape(char))
+    return "".join(parts)
+
+
+class KeywordMatcher:
+    """Case-insensitive substring search for many keywords at once (Aho-Corasick).
+
+    The keyword set is compiled into a trie with failure links up front, after
+    which every message is scanned in a single pass over its characters no
+    matter how many keywords there are.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self.goto = [{}]  # node -> {character: next node}
+        self.fail = [0]
+        self.output = [None]  # node -> a keyword ending here or at one of its suffixes
+
+        for keyword in self.keywords:
+            pattern = keyword.lower()
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(None)
+                node = next_node
+            if self.output[node] is None:
+                self.output[node] = keyword
+
+        # Breadth-first, so a node's failure target is always finished before it
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                target = self.goto[state].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                if self.output[child] is None:
+                    self.output[child] = self.output[self.fail[child]]
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def search(self, text):
+        """Return the first keyword found in text, or None."""
+        goto, fail, output = self.goto, self.fail, self.output
+        node = 0
+        for char in text.lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node] is not None:
+                return output[node]
+        return None
+
+
+class RuleSet:
+    """One guild's compiled AutoMod rules.
+
+    Keywords share a single KeywordMatcher; regex and glob rules are compiled
+    once with the regex module so every search can be given a timeout. Text
+    passed to the match methods must already be normalize()d.
+    """
+
+    def __init__(self, rules):
+        self.keywords = KeywordMatcher(normalize(pattern) for kind, pattern in rules if kind == "keyword")
+        self.originals = {normalize(pattern): pattern for kind, pattern in rules if kind == "keyword"}
+        self.patterns = []  # (original rule, compiled pattern)
+        for kind, pattern in rules:
+            if kind == "keyword":
+                continue
+            try:
+                self.patterns.append((pattern, compile_rule(kind, pattern)))
+            except regex.error as e:
+                print(f"Skipping invalid AutoMod {kind} rule {pattern!r}: {e}")
+
+    def __len__(self):
+        return len(self.keywords) + len(self.patterns)
+
+    def match_keywords(self, text):
+        keyword = self.keywords.search(text)
+        return self.originals.get(keyword)
+
+    def match_patterns(self, text, budget):
+        """Return the first pattern rule matching text, giving up once budget seconds are spent.
+
+        Runs in a worker thread; concurrent=True lets the regex module release
+        the GIL while it searches.
+        """
+        deadline = time.monotonic() + budget
+        for pattern, compiled in self.patterns:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("AutoMod time budget exhausted")
+            if compiled.search(text, timeout=remaining, concurrent=True):
+                return pattern
+        return None
+
+
+def compile_rule(kind, pattern):
+    """Compile a regex or glob rule, raising regex.error if it is invalid."""
+    if kind == "glob":
+        return regex.compile(glob_to_regex(pattern), regex.DOTALL)
+    return regex.compile(pattern, regex.IGNORECASE | regex.DOTALL)
@@ -0,0 +1,125 @@
+import asyncio
+import re
+from utils.schema import SPLIT_GIVEAWAY_PARTICIPANTS
+
+# Legacy per-guild tables and how their rows map onto the shared tables.
+# Each entry: (database, table name pattern, legacy columns, insert statement).
+# The insert statement always takes guild_id first, followed by the legacy columns.
+# Legacy XP is added to XP earned since the shared levels table went live; the
+# xp/level columns of merged rows are rederived afterwards (Exp.recalculate_levels).
+LEGACY_TABLES = [
+    (
+        "levelsys",
+        re.compile(r"users_(\d+)"),
+        "id, xp, level",
+        """
+        INSERT INTO levels (guild_id, user_id, xp, level, total_xp) VALUES (?1, ?2, ?3, ?4, 50 * ?4 * (?4 - 1) + ?3)
+        ON CONFLICT (guild_id, user_id) DO UPDATE SET total_xp = levels.total_xp + excluded.total_xp
+        """,
+    ),
+    (
+        "configs",
+        re.compile(r"afk_(\d+)"),
+        "user_id, reason",
+        "INSERT OR IGNORE INTO afk (guild_id, user_id, reason) VALUES (?, ?, ?)",
+    ),
+    (
+        "configs",
+        re.compile(r"warns_(\d+)"),
+        "user_id, reason",
+        "INSERT INTO warns (guild_id, user_id, reason) VALUES (?, ?, ?)",
+    ),
+    (
+        "configs",
+        re.compile(r"invite_config_(\d+)"),
+        "invite_count",
+        "INSERT OR IGNORE INTO invite_config (guild_id, invite_count) VALUES (?, ?)",
+    ),
+    (
+        "configs",
+        re.compile(r"ping_roles_(\d+)"),
+        "message_id, reaction, role_id",
+        "INSERT OR IGNORE INTO ping_roles (guild_id, message_id, reaction, role_id) VALUES (?, ?, ?, ?)",
+    ),
+    (
+        "configs",
+        re.compile(r"channel_ping_roles_(\d+)"),
+        "channel_id, role_id",
+        "INSERT OR IGNORE INTO channel_ping_roles (guild_id, channel_id, role_id) VALUES (?, ?, ?)",
+    ),
+    (
+        "giveaways",
+        re.compile(r"giveaways_(\d+)"),
+        "channel_id, message_id, prize, end_time, num_winners, host_id, participants",
+        # Legacy end times came from naive datetime.utcnow().timestamp(), i.e. the UTC wall
+        # clock read as local time; reading them back as local time recovers the real instant
+        """
+        INSERT OR IGNORE INTO giveaways (guild_id, channel_id, message_id, prize, end_time, num_winners, host_id, participants)
+        VALUES (?1, ?2, ?3, ?4, CAST(strftime('%s', ?5, 'unixepoch', 'localtime') AS INTEGER), ?6, ?7, ?8)
+        """,
+    ),
+]
+
+# Statements run after each copied batch, for legacy formats that need reshaping
+AFTER_BATCH = {
+    "giveaways": SPLIT_GIVEAWAY_PARTICIPANTS,
+}
+
+BATCH_SIZE = 500
+
+
+class LegacyTableMigrator:
+    """Streams rows from the old per-guild tables into the shared tables.
+
+    Every batch is copied and deleted from its source in one transaction, so an
+    interrupted run can simply be started again. Control goes back to the event
+    loop between batches so the bot keeps handling events while it runs.
+    """
+
+    def __init__(self, databases, batch_size=BATCH_SIZE):
+        self.databases = databases
+        self.batch_size = batch_size
+        self.lock = asyncio.Lock()
+
+    async def find_legacy_tables(self):
+        tables = []
+        for database_name, pattern, columns, insert_sql in LEGACY_TABLES:
+            db = getattr(self.databases, database_name)
+            rows = await db.fetchall("SELECT name FROM sqlite_master WHERE type = 'table'")
+            for (name,) in rows:
+                match = pattern.fullmatch(name)
+                if match:
+                    tables.append((db, name, int(match.group(1)), columns, insert_sql, AFTER_BATCH.get(database_name, [])))
+        return tables
+
+    async def migrate_table(self, db, table_name, guild_id, columns, insert_sql, after_batch=()):
+        moved = 0
+        while True:
+            rows = await db.fetchall(
+                f"SELECT rowid, {columns} FROM {table_name} ORDER BY rowid LIMIT ?",
+                (self.batch_size,)
+            )
+            if not rows:
+                break
+            async with db.transaction() as conn:
+                await conn.executemany(insert_sql, [(guild_id, *row[1:]) for row in rows])
+                for sql in after_batch:
+                    await conn.execute(sql)
+                await conn.execute(f"DELETE FROM {table_name} WHERE rowid <= ?", (rows[-1][0],))
+            moved += len(rows)
+            await asyncio.sleep(0)
+        await db.execute(f"DROP TABLE {table_name}")
+        return moved
+
+    async def run(self, progress=None):
+        """Migrate every legacy table, returning (tables migrated, rows moved, IDs of guilds touched)."""
+        async with self.lock:
+            tables = await self.find_legacy_tables()
+            total_rows = 0
+            guild_ids = set()
+            for index, table in enumerate(tables, start=1):
+                total_rows += await self.migrate_table(*table)
+                guild_ids.add(table[2])
+                if progress:
+                    await progress(index, len(tables), total_rows)
+            return len(tables), total_rows, guild_ids
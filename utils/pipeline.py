@@ -0,0 +1,95 @@
+import functools
+import time
+import traceback
+from utils.matcher import normalize
+
+# Every message goes through the registered stages in this order. A stage that
+# acts on the message as a whole (AutoMod deleting it) can stop later stages.
+STAGE_ORDER = ("automod", "afk", "pingroles", "exp")
+
+
+class MessageContext:
+    """Everything the stages need about one message, worked out once."""
+
+    def __init__(self, message):
+        self.message = message
+        self.guild = message.guild
+        self.channel = message.channel
+        self.author = message.author
+        self.content = message.content
+        self.mentions = [user for user in message.mentions if not user.bot]
+        self.config = {}  # stage name -> that stage's guild config snapshot
+        self.stopped = False
+
+    @functools.cached_property
+    def normalized(self):
+        return normalize(self.content)
+
+    def stop(self):
+        """Skip every stage after the current one."""
+        self.stopped = True
+
+
+class Stage:
+    __slots__ = ("handler", "snapshot", "calls", "total_time", "max_time")
+
+    def __init__(self, handler, snapshot):
+        self.handler = handler
+        self.snapshot = snapshot
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+
+class MessagePipeline:
+    """The bot's single on_message handler, shared by cogs through bot.pipeline.
+
+    Cogs register a stage under one of the names in STAGE_ORDER: an async
+    handler taking a MessageContext, and optionally an async snapshot function
+    whose result is stored in context.config before the handler runs. Each
+    stage's latency is recorded for /status.
+    """
+
+    def __init__(self, order=STAGE_ORDER):
+        self.order = order
+        self.stages = {}
+
+    def register(self, name, handler, snapshot=None):
+        if name not in self.order:
+            raise ValueError(f"Unknown message stage: {name}")
+        self.stages[name] = Stage(handler, snapshot)
+
+    def unregister(self, name):
+        self.stages.pop(name, None)
+
+    async def process(self, message):
+        if message.author.bot or not message.guild:
+            return
+        context = MessageContext(message)
+        for name in self.order:
+            stage = self.stages.get(name)
+            if stage is None:
+                continue
+            start = time.perf_counter()
+            try:
+                if stage.snapshot:
+                    context.config[name] = await stage.snapshot(context)
+                await stage.handler(context)
+            except Exception:
+                print(f"Message stage {name} failed:\n{traceback.format_exc()}")
+            elapsed = time.perf_counter() - start
+            stage.calls += 1
+            stage.total_time += elapsed
+            stage.max_time = max(stage.max_time, elapsed)
+            if context.stopped:
+                break
+
+    def latency_report(self):
+        """Return (stage name, calls, average ms, max ms) in pipeline order."""
+        report = []
+        for name in self.order:
+            stage = self.stages.get(name)
+            if stage is not None:
+                average = stage.total_time / stage.calls * 1000 if stage.calls else 0.0
+                report.append((name, stage.calls, average, stage.max_time * 1000))
+        return report
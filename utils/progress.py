@@ -0,0 +1,25 @@
+import discord
+
+
+class InteractionProgress:
+    """Reports a long job's progress on a deferred interaction.
+
+    Interactions expire after 15 minutes while the job keeps going: later
+    progress edits are dropped, and the final embed goes to the channel
+    instead.
+    """
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    async def update(self, content):
+        try:
+            await self.ctx.interaction.edit_original_response(content=content)
+        except discord.HTTPException:
+            pass
+
+    async def finish(self, embed):
+        try:
+            await self.ctx.interaction.edit_original_response(content=None, embed=embed)
+        except discord.HTTPException:
+            await self.ctx.channel.send(embed=embed)
@@ -0,0 +1,96 @@
+import asyncio
+import discord
+from utils.joins import run_paced
+
+ROLE_WINDOW = 1.0  # Seconds of role changes collected per member before one edit
+ROLE_CONCURRENCY = 3  # Member edits in flight at once
+ROLE_INTERVAL = 0.25  # Pause after each edit in a worker slot
+
+
+class PendingRoles:
+    __slots__ = ("member", "changes", "reason", "futures")
+
+    def __init__(self, member):
+        self.member = member
+        self.changes = {}  # role_id -> True to add, False to remove; the last request wins
+        self.reason = None
+        self.futures = []
+
+
+class RoleMutationQueue:
+    """Coalesces role changes per member, shared through bot.roles.
+
+    Adds and removes requested within ROLE_WINDOW are merged per member, the
+    last request for a role winning, and roles the member was seen with
+    when the request was made are not added again. What is left goes out as
+    at most one add_roles and one remove_roles call, through a small paced
+    worker pool so bursts of level-ups, reaction roles or joins stay under
+    rate limits. The member's full role list is never rewritten, since the
+    bot has no member updates to keep cached roles current.
+    """
+
+    def __init__(self, window=ROLE_WINDOW, concurrency=ROLE_CONCURRENCY, interval=ROLE_INTERVAL):
+        self.window = window
+        self.concurrency = concurrency
+        self.interval = interval
+        self.pending = {}  # (guild_id, member_id) -> PendingRoles
+        self.task = None
+
+    def add(self, member, *roles, reason=None):
+        """Queue roles to give member. Returns a future resolving to whether the member was edited."""
+        return self._queue(member, roles, True, reason)
+
+    def remove(self, member, *roles, reason=None):
+        """Queue roles to take from member. Returns a future like add()."""
+        return self._queue(member, roles, False, reason)
+
+    def _queue(self, member, roles, present, reason):
+        key = (member.guild.id, member.id)
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = self.pending[key] = PendingRoles(member)
+        entry.member = member
+        for role in roles:
+            entry.changes[role.id] = present
+        if reason:
+            entry.reason = reason
+        future = asyncio.get_running_loop().create_future()
+        entry.futures.append(future)
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._run())
+        return future
+
+    async def _run(self):
+        while self.pending:
+            await asyncio.sleep(self.window)
+            batch, self.pending = list(self.pending.values()), {}
+            await run_paced(batch, self._apply, concurrency=self.concurrency, interval=self.interval)
+
+    @staticmethod
+    def delta(member, changes):
+        """Return (roles to add, roles to remove) for changes, given the roles member was seen with."""
+        guild = member.guild
+        held = {role.id for role in member.roles}
+        add = [guild.get_role(role_id) for role_id, present in changes.items() if present and role_id not in held]
+        # Removals are not checked against held roles: one granted since member was seen would be missed
+        remove = [guild.get_role(role_id) for role_id, present in changes.items() if not present]
+        return [role for role in add if role is not None], [role for role in remove if role is not None]
+
+    async def _apply(self, entry):
+        # entry.member is the object the latest request came with, not the member cache
+        member = entry.member
+        edited = False
+        try:
+            add, remove = self.delta(member, entry.changes)
+            if add:
+                await member.add_roles(*add, reason=entry.reason)
+                edited = True
+            if remove:
+                await member.remove_roles(*remove, reason=entry.reason)
+                edited = True
+        except discord.HTTPException as e:
+            print(f"Failed to update roles for member {member.id} in guild {member.guild.id}: {e}")
+        finally:
+            for future in entry.futures:
+                if not future.done():
+                    future.set_result(edited)
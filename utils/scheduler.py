@@ -0,0 +1,62 @@
+import asyncio
+import heapq
+import time
+import traceback
+
+
+class DeadlineScheduler:
+    """Calls an async callback for each key once its deadline (a Unix timestamp) passes.
+
+    Deadlines live in a min-heap and a single task sleeps until the earliest
+    one, so the cost depends on how many deadlines are pending, not on how
+    often anything is polled. Rescheduling or cancelling a key leaves its old
+    heap entry in place; stale entries are skipped when they reach the top.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.heap = []  # (deadline, key)
+        self.deadlines = {}  # key -> current deadline
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def schedule(self, key, deadline):
+        self.deadlines[key] = deadline
+        heapq.heappush(self.heap, (deadline, key))
+        if self.heap[0] == (deadline, key):
+            self.wakeup.set()
+
+    def cancel(self, key):
+        self.deadlines.pop(key, None)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            while self.heap and self.heap[0][0] <= now:
+                deadline, key = heapq.heappop(self.heap)
+                if self.deadlines.get(key) == deadline:
+                    del self.deadlines[key]
+                    asyncio.ensure_future(self._fire(key))
+            timeout = self.heap[0][0] - now if self.heap else None
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, key):
+        try:
+            await self.callback(key)
+        except Exception:
+            print(f"Scheduled task for {key} failed:\n{traceback.format_exc()}")
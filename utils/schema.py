@@ -0,0 +1,283 @@
+from colorama import Fore, Style
+
+# Moves comma-joined giveaway participants into giveaway_entries. Also run by
+# the legacy table migrator, since old per-guild tables still use that format.
+SPLIT_GIVEAWAY_PARTICIPANTS = [
+    """
+    INSERT OR IGNORE INTO giveaway_entries (guild_id, message_id, user_id)
+    WITH RECURSIVE split (guild_id, message_id, user_id, rest) AS (
+        SELECT guild_id, message_id, '', participants || ',' FROM giveaways WHERE participants != ''
+        UNION ALL
+        SELECT guild_id, message_id, substr(rest, 1, instr(rest, ',') - 1), substr(rest, instr(rest, ',') + 1)
+        FROM split WHERE rest != ''
+    )
+    SELECT guild_id, message_id, CAST(user_id AS INTEGER) FROM split WHERE user_id != ''
+    """,
+    "UPDATE giveaways SET participants = '' WHERE participants != ''",
+]
+
+# Numbered schema migrations for each database file. The applied version is
+# stored in the file itself (PRAGMA user_version), so each step runs exactly
+# once. Append new steps with the next number; never edit a step that has
+# already shipped. Version 1 uses IF NOT EXISTS because it describes tables
+# that older releases created on the fly.
+MIGRATIONS = {
+    "economy": [
+        (1, [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                coins INTEGER NOT NULL,
+                weekly_timestamp INTEGER NOT NULL,
+                daily_timestamp INTEGER NOT NULL,
+                bank INTEGER NOT NULL
+            )
+            """,
+        ]),
+        (2, [
+            # Covers keyset leaderboard pages; id is the rowid, so it comes with every entry
+            "CREATE INDEX IF NOT EXISTS idx_users_coins ON users (coins)",
+        ]),
+    ],
+    "configs": [
+        (1, [
+            """
+            CREATE TABLE IF NOT EXISTS welcome_config (
+                guild_id INTEGER PRIMARY KEY,
+                channel_id INTEGER,
+                message TEXT,
+                color TEXT,
+                title TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS autorole_config (
+                guild_id INTEGER PRIMARY KEY,
+                role_id INTEGER
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS coupons (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT NOT NULL,
+                coins INTEGER NOT NULL,
+                max_uses INTEGER NOT NULL,
+                usedby TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS afk (
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                reason TEXT,
+                PRIMARY KEY (guild_id, user_id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS warns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                reason TEXT
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_warns_member ON warns (guild_id, user_id)",
+            """
+            CREATE TABLE IF NOT EXISTS invite_config (
+                guild_id INTEGER PRIMARY KEY,
+                invite_count INTEGER
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS ping_roles (
+                guild_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                reaction TEXT NOT NULL,
+                role_id INTEGER,
+                PRIMARY KEY (guild_id, message_id, reaction)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS channel_ping_roles (
+                guild_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                role_id INTEGER,
+                PRIMARY KEY (guild_id, channel_id)
+            )
+            """,
+        ]),
+        (2, [
+            """
+            CREATE TABLE IF NOT EXISTS username_cache (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT NOT NULL,
+                fetched_at INTEGER NOT NULL
+            )
+            """,
+        ]),
+        (3, [
+            # Join batches at least this large get one combined welcome message
+            "ALTER TABLE welcome_config ADD COLUMN batch_threshold INTEGER NOT NULL DEFAULT 5",
+        ]),
+        (4, [
+            # Maintained one upsert per join/leave by utils.counters
+            """
+            CREATE TABLE IF NOT EXISTS member_counters (
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                joins INTEGER NOT NULL DEFAULT 0,
+                leaves INTEGER NOT NULL DEFAULT 0,
+                inviter_id INTEGER,
+                fake INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (guild_id, user_id)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS invite_counters (
+                guild_id INTEGER NOT NULL,
+                inviter_id INTEGER NOT NULL,
+                regular INTEGER NOT NULL DEFAULT 0,
+                leaves INTEGER NOT NULL DEFAULT 0,
+                fake INTEGER NOT NULL DEFAULT 0,
+                bonus INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (guild_id, inviter_id)
+            ) WITHOUT ROWID
+            """,
+        ]),
+        (5, [
+            # Several autoroles per guild, each with an optional delay after joining
+            """
+            CREATE TABLE IF NOT EXISTS autoroles (
+                guild_id INTEGER NOT NULL,
+                role_id INTEGER NOT NULL,
+                delay INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (guild_id, role_id)
+            )
+            """,
+            "INSERT OR IGNORE INTO autoroles (guild_id, role_id) SELECT guild_id, role_id FROM autorole_config WHERE role_id IS NOT NULL",
+            "DROP TABLE autorole_config",
+            # Cursor of an unfinished /autorole sync, so it resumes after a restart
+            """
+            CREATE TABLE IF NOT EXISTS autorole_sync (
+                guild_id INTEGER PRIMARY KEY,
+                last_member_id INTEGER NOT NULL DEFAULT 0,
+                updated INTEGER NOT NULL DEFAULT 0
+            )
+            """,
+        ]),
+    ],
+    "giveaways": [
+        (1, [
+            """
+            CREATE TABLE IF NOT EXISTS giveaways (
+                guild_id INTEGER NOT NULL,
+                channel_id INTEGER,
+                message_id INTEGER NOT NULL,
+                prize TEXT,
+                end_time INTEGER,
+                num_winners INTEGER,
+                host_id INTEGER,
+                participants TEXT,
+                PRIMARY KEY (guild_id, message_id)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_giveaways_end_time ON giveaways (end_time)",
+        ]),
+        (2, [
+            """
+            CREATE TABLE giveaway_entries (
+                guild_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                PRIMARY KEY (guild_id, message_id, user_id)
+            ) WITHOUT ROWID
+            """,
+            *SPLIT_GIVEAWAY_PARTICIPANTS,
+        ]),
+        (3, [
+            # 'entries' records reactions as they happen; 'harvest' reads the reactions at draw time
+            "ALTER TABLE giveaways ADD COLUMN mode TEXT NOT NULL DEFAULT 'entries'",
+            # Ended giveaways are kept so they can be rerolled
+            "ALTER TABLE giveaways ADD COLUMN ended INTEGER NOT NULL DEFAULT 0",
+        ]),
+        (4, [
+            # Entry requirements, checked when winners are drawn; role lists are comma-separated IDs
+            "ALTER TABLE giveaways ADD COLUMN min_level INTEGER NOT NULL DEFAULT 0",
+            "ALTER TABLE giveaways ADD COLUMN min_coins INTEGER NOT NULL DEFAULT 0",
+            "ALTER TABLE giveaways ADD COLUMN required_roles TEXT NOT NULL DEFAULT ''",
+            "ALTER TABLE giveaways ADD COLUMN blocked_roles TEXT NOT NULL DEFAULT ''",
+        ]),
+    ],
+    "levelsys": [
+        (1, [
+            """
+            CREATE TABLE IF NOT EXISTS levels (
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                xp INTEGER NOT NULL,
+                level INTEGER NOT NULL,
+                PRIMARY KEY (guild_id, user_id)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_levels_rank ON levels (guild_id, level DESC, xp DESC)",
+        ]),
+        (2, [
+            # Store total XP so levels can be derived from the curve instead of accumulated
+            "ALTER TABLE levels ADD COLUMN total_xp INTEGER NOT NULL DEFAULT 0",
+            "UPDATE levels SET total_xp = 50 * level * (level - 1) + xp",
+            "DROP INDEX IF EXISTS idx_levels_rank",
+            "CREATE INDEX idx_levels_rank ON levels (guild_id, total_xp DESC)",
+        ]),
+        (3, [
+            # Covering index for keyset leaderboard pages ordered by (total_xp, user_id)
+            "DROP INDEX IF EXISTS idx_levels_rank",
+            "CREATE INDEX idx_levels_rank ON levels (guild_id, total_xp, user_id)",
+        ]),
+        (4, [
+            """
+            CREATE TABLE IF NOT EXISTS level_roles (
+                guild_id INTEGER NOT NULL,
+                level INTEGER NOT NULL,
+                role_id INTEGER NOT NULL,
+                PRIMARY KEY (guild_id, level)
+            )
+            """,
+        ]),
+    ],
+    "automod": [
+        (1, [
+            """
+            CREATE TABLE IF NOT EXISTS automod_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id TEXT NOT NULL,
+                keyword TEXT NOT NULL
+            )
+            """,
+        ]),
+        (2, [
+            "ALTER TABLE automod_rules ADD COLUMN kind TEXT NOT NULL DEFAULT 'keyword'",
+        ]),
+    ],
+}
+
+
+async def get_version(db):
+    row = await db.fetchone("PRAGMA user_version")
+    return row[0]
+
+
+async def apply_migrations(databases):
+    """Bring every database file up to the latest schema version."""
+    for name, steps in MIGRATIONS.items():
+        db = getattr(databases, name)
+        current = await get_version(db)
+        for version, statements in steps:
+            if version <= current:
+                continue
+            async with db.transaction() as conn:
+                # DDL does not open a transaction implicitly, so start one to keep the step atomic
+                await conn.execute("BEGIN")
+                for sql in statements:
+                    await conn.execute(sql)
+                await conn.execute(f"PRAGMA user_version = {version}")
+            print(f"{Fore.BLUE}INFO:{Style.RESET_ALL} Migrated {name}.db to schema version {version}.")
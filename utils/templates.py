@@ -0,0 +1,119 @@
+import random
+import re
+import discord
+
+PLACEHOLDER = re.compile(r"%([a-z_]+)%")
+DEFAULT_AVATAR = "https://i.postimg.cc/fLQJvHRb/blank-profile-picture.png"
+
+
+class WelcomeContext:
+    """What a welcome message can talk about: the member, and the invite they used if known."""
+
+    def __init__(self, member, invite=None, member_counts=None, invite_counts=None):
+        self.member = member
+        self.invite = invite
+        self.inviter = invite.inviter if invite else None
+        self.member_counts = member_counts  # (joins, leaves), loaded only if the template needs it
+        self.invite_counts = invite_counts  # the inviter's InviteCounts, likewise
+
+
+def _inviter(attribute, default="Unknown"):
+    return lambda ctx: getattr(ctx.inviter, attribute) if ctx.inviter else default
+
+
+def _invite(value):
+    return lambda ctx: value(ctx.invite) if ctx.invite else "N/A"
+
+
+def _member_count(index):
+    return lambda ctx: ctx.member_counts[index] if ctx.member_counts else "N/A"
+
+
+def _invite_count(attribute):
+    return lambda ctx: getattr(ctx.invite_counts, attribute) if ctx.invite_counts else "N/A"
+
+
+def _days_since(moment):
+    return (discord.utils.utcnow() - moment).days
+
+
+# Placeholder name -> function computing its value, called only for placeholders a template uses
+VARIABLES = {
+    "inviter": _inviter("display_name"),
+    "inviter_name": _inviter("name"),
+    "inviter_discriminator": _inviter("discriminator", "0000"),
+    "inviter_mention": _inviter("mention"),
+    "inviter_id": _inviter("id"),
+    "inviter_avatar": lambda ctx: ctx.inviter.avatar.url if ctx.inviter and ctx.inviter.avatar else DEFAULT_AVATAR,
+    "inviter_invites": _invite_count("total"),
+    "inviter_reg_invites": _invite_count("regular"),
+    "inviter_leave_invites": _invite_count("leaves"),
+    "inviter_fake_invites": _invite_count("fake"),
+    "inviter_bonus_invites": _invite_count("bonus"),
+    "member": lambda ctx: ctx.member.display_name,
+    "member_name": lambda ctx: ctx.member.name,
+    "member_discriminator": lambda ctx: ctx.member.discriminator,
+    "member_mention": lambda ctx: ctx.member.mention,
+    "member_id": lambda ctx: ctx.member.id,
+    "member_avatar": lambda ctx: ctx.member.avatar.url if ctx.member.avatar else DEFAULT_AVATAR,
+    "member_created": lambda ctx: ctx.member.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+    "member_created_ago": lambda ctx: _days_since(ctx.member.created_at),
+    "member_joined": lambda ctx: ctx.member.joined_at.strftime("%Y-%m-%d %H:%M:%S"),
+    "member_joined_ago": lambda ctx: _days_since(ctx.member.joined_at),
+    "member_join_count": _member_count(0),
+    "member_leave_count": _member_count(1),
+    "guild_name": lambda ctx: ctx.member.guild.name,
+    "guild_avatar": lambda ctx: ctx.member.guild.icon.url if ctx.member.guild.icon else DEFAULT_AVATAR,
+    "guild_count": lambda ctx: ctx.member.guild.member_count,
+    "invite_code": _invite(lambda invite: invite.code),
+    "invite_uses": _invite(lambda invite: invite.uses),
+    "invite_url": _invite(lambda invite: f"https://discord.gg/{invite.code}"),
+    "random_color": lambda ctx: "#{:06x}".format(random.randint(0, 0xFFFFFF)),
+}
+
+INVITE_VARIABLES = frozenset(name for name in VARIABLES if name.startswith("invite"))
+MEMBER_COUNT_VARIABLES = frozenset(("member_join_count", "member_leave_count"))
+INVITE_COUNT_VARIABLES = frozenset(name for name in VARIABLES if name.startswith("inviter_") and name.endswith("_invites"))
+
+
+class WelcomeTemplate:
+    """A welcome message split once into literal text and placeholders.
+
+    Rendering only evaluates the placeholders that actually appear, each at
+    most once. Unknown %names% are kept as literal text.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.segments = []  # str for literal text, (name,) for a placeholder
+        position = 0
+        match = PLACEHOLDER.search(text)
+        while match:
+            if match.group(1) not in VARIABLES:
+                # The closing % may open a real placeholder, e.g. "50%off%member%"
+                match = PLACEHOLDER.search(text, match.start() + 1)
+                continue
+            if match.start() > position:
+                self.segments.append(text[position:match.start()])
+            self.segments.append((match.group(1),))
+            position = match.end()
+            match = PLACEHOLDER.search(text, position)
+        if position < len(text):
+            self.segments.append(text[position:])
+        self.names = frozenset(segment[0] for segment in self.segments if isinstance(segment, tuple))
+
+    @property
+    def uses_invite(self):
+        return not self.names.isdisjoint(INVITE_VARIABLES)
+
+    @property
+    def uses_member_counts(self):
+        return not self.names.isdisjoint(MEMBER_COUNT_VARIABLES)
+
+    @property
+    def uses_invite_counts(self):
+        return not self.names.isdisjoint(INVITE_COUNT_VARIABLES)
+
+    def render(self, context):
+        values = {name: str(VARIABLES[name](context)) for name in self.names}
+        return "".join(segment if isinstance(segment, str) else values[segment[0]] for segment in self.segments)
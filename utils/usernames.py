@@ -0,0 +1,136 @@
+import asyncio
+import collections
+import time
+import aiohttp
+
+LOOKUP_URL = "https://discordlookup.mesalytic.moe/v1/user/{user_id}"
+
+CACHE_SIZE = 5000
+CACHE_TTL = 7 * 24 * 3600  # Names fetched from the API are trusted for a week
+FAILURE_TTL = 300  # Failed lookups are retried after five minutes
+MAX_CONCURRENT_LOOKUPS = 8
+PERSIST_DELAY = 10  # Seconds to collect new names before writing them out
+
+
+class UsernameResolver:
+    """Turns user IDs into display names for leaderboards, shared through bot.usernames.
+
+    Lookups go to the bot's own user cache first, then an in-memory LRU, then
+    the username_cache table, and only then to the lookup API. Concurrent
+    requests for the same ID share one lookup, API calls go through a single
+    session with a bounded number in flight, and newly fetched names are
+    written to the database in batches off the request path.
+    """
+
+    def __init__(self, bot, db, max_size=CACHE_SIZE, ttl=CACHE_TTL, concurrency=MAX_CONCURRENT_LOOKUPS):
+        self.bot = bot
+        self.db = db
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache = collections.OrderedDict()  # user_id -> (username, expires_at)
+        self.in_flight = {}  # user_id -> asyncio.Task
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session = None
+        self.unsaved = {}  # user_id -> (username, fetched_at)
+        self.persist_task = None
+
+    @staticmethod
+    def fallback(user_id):
+        return f"User: {user_id}"
+
+    def _remember(self, user_id, username, ttl):
+        self.cache[user_id] = (username, time.time() + ttl)
+        self.cache.move_to_end(user_id)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    async def resolve(self, user_id):
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            return user.name
+
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            if cached[1] > time.time():
+                self.cache.move_to_end(user_id)
+                return cached[0]
+            del self.cache[user_id]
+
+        task = self.in_flight.get(user_id)
+        if task is None:
+            task = self.in_flight[user_id] = asyncio.ensure_future(self._lookup(user_id))
+            task.add_done_callback(lambda _: self.in_flight.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def resolve_many(self, user_ids):
+        """Resolve several IDs concurrently, returning {user_id: username}."""
+        user_ids = list(dict.fromkeys(user_ids))
+        names = await asyncio.gather(*(self.resolve(user_id) for user_id in user_ids))
+        return dict(zip(user_ids, names))
+
+    async def _lookup(self, user_id):
+        now = int(time.time())
+        row = await self.db.fetchone(
+            "SELECT username, fetched_at FROM username_cache WHERE user_id = ?", (user_id,)
+        )
+        if row is not None and row[1] + self.ttl > now:
+            self._remember(user_id, row[0], row[1] + self.ttl - now)
+            return row[0]
+
+        username = await self._fetch(user_id)
+        if username is None:
+            self._remember(user_id, self.fallback(user_id), FAILURE_TTL)
+            return self.fallback(user_id)
+        self._remember(user_id, username, self.ttl)
+        self.unsaved[user_id] = (username, now)
+        if self.persist_task is None or self.persist_task.done():
+            self.persist_task = asyncio.ensure_future(self._persist_later())
+        return username
+
+    async def _fetch(self, user_id):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        async with self.semaphore:
+            try:
+                async with self.session.get(LOOKUP_URL.format(user_id=user_id)) as resp:
+                    if resp.status != 200:
+                        return None
+                    user_data = await resp.json()
+                    return user_data.get("username")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return None
+
+    async def _persist_later(self):
+        await asyncio.sleep(PERSIST_DELAY)
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Failed to save cached usernames: {e}")
+
+    async def flush(self):
+        if not self.unsaved:
+            return
+        batch, self.unsaved = self.unsaved, {}
+        try:
+            await self.db.executemany(
+                """
+                INSERT INTO username_cache (user_id, username, fetched_at) VALUES (?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET username = excluded.username, fetched_at = excluded.fetched_at
+                """,
+                [(user_id, username, fetched_at) for user_id, (username, fetched_at) in batch.items()]
+            )
+        except BaseException:
+            for user_id, entry in batch.items():
+                self.unsaved.setdefault(user_id, entry)
+            raise
+
+    async def close(self):
+        if self.persist_task is not None and not self.persist_task.done():
+            self.persist_task.cancel()
+            try:
+                await self.persist_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        if self.session is not None:
+            await self.session.close()